@@ -0,0 +1,159 @@
+# 命令行入口（无界面），例如：
+#   python setm_cli.py video.mp4 --lang ja --targets zh,en --mode soft
+#   python setm_cli.py --translate 原文.srt --lang ja --targets zh
+#   python setm_cli.py --queue-add ep01.mp4 ep02.mp4 --queue-run
+#   python setm_cli.py --tm-export tm.jsonl
+# 只依赖 setm_core，不导入PyQt5；requests、whisper 等在用到时才导入
+import os
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from setm_core import (
+    CallbackSignal, DEFAULT_TARGET_LANG, JobQueue, ProgressThrottle, QUEUE_STAGE_TITLES, SUBTITLE_MODES, SubtitleJob,
+    TARGET_LANGUAGES, format_eta, get_translation_memory, load_config, load_target_languages, parse_target_languages,
+    shutdown_whisper_worker, translate_srt_file
+)
+
+# 读取API Key，未配置时返回空字符串
+def load_api_key():
+    return load_config().get('DeepSeek', 'api_key', fallback='')
+
+# 翻译记忆库维护命令，例如：python setm_cli.py --tm-export tm.jsonl
+def run_translation_memory_command(argv):
+    parser = argparse.ArgumentParser(description="翻译记忆库维护")
+    parser.add_argument("--tm-export", metavar="JSONL", help="导出翻译记忆库")
+    parser.add_argument("--tm-import", metavar="JSONL", help="从导出文件预热翻译记忆库")
+    parser.add_argument("--tm-warm", nargs=3, metavar=("SOURCE_SRT", "TRANSLATED_SRT", "LANG"),
+                        help="用已有的原文/译文SRT预热翻译记忆库")
+    parser.add_argument("--tm-target-lang", default=DEFAULT_TARGET_LANG, choices=list(TARGET_LANGUAGES),
+                        help="--tm-warm 中译文SRT的语言（默认 zh）")
+    parser.add_argument("--tm-model", help="--tm-warm 导入条目对应的翻译模型（默认为当前配置的翻译后端的模型）")
+    args = parser.parse_args(argv)
+    tm = get_translation_memory()
+    if tm is None:
+        print("翻译记忆库已在 config.ini 中关闭")
+        return 1
+    if args.tm_export:
+        print(f"已导出 {tm.export_jsonl(args.tm_export)} 条")
+    if args.tm_import:
+        print(f"已导入 {tm.import_jsonl(args.tm_import)} 条")
+    if args.tm_warm:
+        print(f"已导入 {tm.warm_from_srt(*args.tm_warm, target_lang=args.tm_target_lang, model=args.tm_model)} 条")
+    return 0
+
+# 批量队列命令（无界面），例如：
+# python setm_cli.py --queue-add ep01.mp4 ep02.mp4 --queue-lang ja --queue-run
+def run_queue_command(argv):
+    parser = argparse.ArgumentParser(description="批量队列")
+    parser.add_argument("--queue-add", nargs="+", metavar="VIDEO", help="加入队列的视频")
+    parser.add_argument("--queue-lang", default="ja", help="视频语言（默认 ja）")
+    parser.add_argument("--queue-model", default="small", help="Whisper模型（默认 small）")
+    parser.add_argument("--queue-targets", help="目标语言，逗号分隔（默认读取 config.ini）")
+    parser.add_argument("--queue-mode", choices=list(SUBTITLE_MODES), help="字幕输出方式（默认读取 config.ini）")
+    parser.add_argument("--queue-run", action="store_true", help="处理队列中所有未完成的任务")
+    parser.add_argument("--queue-list", action="store_true", help="列出队列中的任务及各阶段吞吐量")
+    parser.add_argument("--queue-retry", action="store_true", help="失败的任务从失败的阶段重新排队")
+    parser.add_argument("--queue-clear", action="store_true", help="删除已完成和失败的任务")
+    args = parser.parse_args(argv)
+    try:
+        target_langs = parse_target_languages(args.queue_targets) if args.queue_targets else None
+    except ValueError as e:
+        parser.error(str(e))
+    queue = JobQueue(load_api_key(), print)
+    if args.queue_clear:
+        queue.clear_finished()
+    if args.queue_retry:
+        queue.retry_failed()
+    for video_path in args.queue_add or []:
+        if not os.path.exists(video_path):
+            parser.error(f"视频文件不存在: {video_path}")
+        queue.add(video_path, args.queue_lang, args.queue_model, args.queue_mode, target_langs)
+        print(f"已加入队列: {video_path}")
+    if args.queue_list:
+        for record in queue.records:
+            stage = QUEUE_STAGE_TITLES.get(record["stage"], record["stage"])
+            print(f"{record['id']}  {record['status']:8}  {stage}  {record['video_path']}  {record['error']}")
+        print(queue.throughput_report())
+    if args.queue_run:
+        queue.start()
+        try:
+            queue.wait()
+        finally:
+            # Ctrl+C 时中止正在执行的阶段，状态已保存，下次 --queue-run 继续
+            queue.stop()
+            shutdown_whisper_worker()
+        failed = [r for r in queue.records if r["status"] == "failed"]
+        return 1 if failed else 0
+    return 0
+
+# 处理单个视频（转写-翻译-合成），或只渲染 --preview 指定的时间段
+def run_process_command(args):
+    def show_progress(value, eta):
+        print(f"[PROGRESS] {value}%  剩余 {format_eta(eta)}")
+
+    job = SubtitleJob(
+        args.video, args.lang, args.model, load_api_key(), print, ProgressThrottle(show_progress),
+        subtitle_mode=args.mode, target_langs=args.targets, preview_window=args.preview
+    )
+    outputs = job.run()
+    if outputs is None:
+        return 130
+    print("\n".join(outputs))
+    return 0
+
+# 只翻译已有的SRT字幕，每个目标语言输出 <原文件名>_<语言>.srt
+def run_translate_command(args):
+    base_path = os.path.splitext(args.translate)[0]
+    translated_srts = {lang: f"{base_path}_{lang}.srt" for lang in args.targets}
+    log = CallbackSignal(print)
+    with ThreadPoolExecutor(max_workers=len(translated_srts)) as executor:
+        futures = [
+            executor.submit(translate_srt_file, args.translate, output_srt, load_api_key(), log,
+                            source_lang=args.lang, target_lang=lang)
+            for lang, output_srt in translated_srts.items()
+        ]
+        if not all([future.result() for future in futures]):
+            return 1
+    print("\n".join(translated_srts.values()))
+    return 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if any(arg.startswith("--tm-") for arg in argv):
+        return run_translation_memory_command(argv)
+    if any(arg.startswith("--queue-") for arg in argv):
+        return run_queue_command(argv)
+    parser = argparse.ArgumentParser(
+        description="视频字幕工具（无界面）：字幕提取-->字幕翻译-->字幕合成",
+        epilog="批量队列见 --queue-add/--queue-run/--queue-list，翻译记忆库维护见 --tm-export/--tm-import/--tm-warm"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("video", nargs="?", help="要处理的视频")
+    source.add_argument("--translate", metavar="SRT", help="只翻译已有的SRT字幕，不转写、不合成")
+    parser.add_argument("--lang", default="ja", help="视频/字幕的源语言（默认 ja）")
+    parser.add_argument("--model", default="small", help="Whisper模型（默认 small）")
+    parser.add_argument("--targets", help=f"目标语言，逗号分隔，可选 {', '.join(TARGET_LANGUAGES)}（默认读取 config.ini）")
+    parser.add_argument("--mode", choices=list(SUBTITLE_MODES), help="字幕输出方式（默认读取 config.ini）")
+    parser.add_argument("--preview", nargs=2, type=float, metavar=("START", "DURATION"),
+                        help="只渲染从 START 秒开始、时长 DURATION 秒的预览片段")
+    args = parser.parse_args(argv)
+    try:
+        args.targets = parse_target_languages(args.targets) if args.targets else load_target_languages()
+    except ValueError as e:
+        parser.error(str(e))
+    path = args.translate or args.video
+    if not os.path.exists(path):
+        parser.error(f"文件不存在: {path}")
+    try:
+        return run_translate_command(args) if args.translate else run_process_command(args)
+    except KeyboardInterrupt:
+        print("[INFO] 用户中止")
+        return 130
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+    finally:
+        shutdown_whisper_worker()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3498 @@
+# 字幕处理核心：转写、翻译、合成及批量队列，不依赖Qt，供界面（setm_gui.py）和命令行（setm_cli.py）共用。
+# requests、whisper 等较重的依赖在首次使用时才导入，命令行 --help、只翻译字幕时不会加载用不到的模块
+import os
+import sys
+import subprocess
+import json
+import platform
+import re
+import logging
+import threading
+import time
+import sqlite3
+import hashlib
+import unicodedata
+import shutil
+import wave
+import functools
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import configparser
+
+CONFIG_FILE = 'config.ini'
+
+# 读取配置文件
+def load_config():
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE, encoding='utf-8')
+    return config
+
+# 媒体信息：一次 ffprobe 调用取得 format、streams（需要时连同关键帧索引），
+# 结果按 路径+大小+修改时间 缓存到磁盘，文件变化后自动失效
+class MediaProbe:
+    def __init__(self, path, info):
+        self.path = path
+        self.format = info.get("format") or {}
+        self.streams = info.get("streams") or []
+        self.keyframes = info.get("keyframes")  # 第一条视频流的关键帧时间（秒），未探测时为None
+
+    @property
+    def video_stream(self):
+        for stream in self.streams:
+            if stream.get("codec_type") == "video" and not stream.get("disposition", {}).get("attached_pic"):
+                return stream
+        return {}
+
+    @property
+    def duration(self):
+        for value in (self.format.get("duration"), self.video_stream.get("duration")):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                continue
+        raise ValueError(f"无法获取视频时长: {self.path}")
+
+    @property
+    def start_time(self):
+        """容器的起始时间（秒），MPEG-TS、部分MOV/MP4不为0"""
+        try:
+            return float(self.format.get("start_time") or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    @property
+    def relative_keyframes(self):
+        """减去起始时间后的关键帧时间：ffmpeg的输入端 -ss、segment复用器的切点和字幕时间轴都从0开始"""
+        return [t - self.start_time for t in self.keyframes or []]
+
+    @property
+    def video_bitrate(self):
+        """视频流码率（字符串，例如 "3403000"），取不到时使用容器平均码率，都没有时返回None"""
+        for bitrate in (self.video_stream.get("bit_rate"), self.format.get("bit_rate")):
+            if bitrate and str(bitrate).isdigit() and int(bitrate) > 0:
+                return str(bitrate)
+        return None
+
+    @staticmethod
+    def run_ffprobe(path, keyframes=False):
+        cmd = ["ffprobe", "-v", "error", "-show_format", "-show_streams"]
+        if keyframes:
+            # 只读取包信息不解码，同一次调用中取得关键帧位置
+            cmd += ["-show_entries", "packet=stream_index,pts_time,flags"]
+        cmd += ["-of", "json", path]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                encoding='utf-8', errors='replace', check=True)
+        info = json.loads(result.stdout)
+        packets = info.pop("packets", None)
+        if keyframes:
+            video_index = MediaProbe(path, info).video_stream.get("index")
+            times = []
+            for packet in packets or []:
+                if packet.get("stream_index") == video_index and "K" in packet.get("flags", ""):
+                    try:
+                        times.append(float(packet["pts_time"]))
+                    except (KeyError, TypeError, ValueError):
+                        pass
+            info["keyframes"] = sorted(times)
+        return info
+
+_media_probes = {}
+_media_probes_lock = threading.Lock()
+
+# 获取媒体信息：先查进程内缓存，再查磁盘缓存，都没有时才调用ffprobe
+def probe_media(path, keyframes=False):
+    fingerprint = source_fingerprint(path)
+    with _media_probes_lock:
+        cached = _media_probes.get(fingerprint)
+    if cached is not None and (cached.keyframes is not None or not keyframes):
+        return cached
+    cache_path = os.path.join(get_cache_dir("probe"), f"{fingerprint}.json")
+    info = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            info = None
+    if info is None or (keyframes and info.get("keyframes") is None):
+        info = MediaProbe.run_ffprobe(path, keyframes)
+        tmp_path = cache_path + ".part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(tmp_path, cache_path)
+    probe = MediaProbe(path, info)
+    with _media_probes_lock:
+        _media_probes[fingerprint] = probe
+    return probe
+
+# 打开文件夹
+def open_folder(path):
+    folder = os.path.dirname(path)
+    if platform.system() == "Windows":
+        os.startfile(folder)
+    elif platform.system() == "Darwin":
+        subprocess.Popen(["open", folder])
+    else:
+        subprocess.Popen(["xdg-open", folder])
+
+
+# 定义自定义异常处理部分条数不足的情况
+class PartialTranslationError(Exception):
+    def __init__(self, message, translated_items, missing_indices):
+        super().__init__(message)
+        self.translated_items = translated_items
+        self.missing_indices = missing_indices
+
+# 输出达到max_tokens被截断时抛出
+class TruncatedResponseError(Exception):
+    pass
+
+# API返回429（限流）时抛出，携带服务端要求的等待秒数；paused 表示后端的限流器已按此暂停
+class RateLimitError(Exception):
+    def __init__(self, message, retry_after, paused=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.paused = paused
+
+# 令牌桶限流器，同一进程内的所有翻译任务共享
+class TokenBucketRateLimiter:
+    def __init__(self, rate_per_minute=60, burst=5):
+        self.lock = threading.Lock()
+        self.blocked_until = 0.0
+        self.configure(rate_per_minute, burst)
+
+    def configure(self, rate_per_minute, burst):
+        with self.lock:
+            self.rate = max(rate_per_minute, 1) / 60.0  # 每秒补充的令牌数
+            self.capacity = max(burst, 1)
+            self.tokens = float(self.capacity)
+            self.updated = time.monotonic()
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait_time = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    def pause(self, seconds):
+        """收到429后暂停所有请求，并清空已积累的令牌"""
+        with self.lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self.updated = max(self.updated, self.blocked_until)
+
+DEFAULT_TRANSLATION_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_RATE_LIMIT_BURST = 5
+DEFAULT_RETRY_AFTER = 10
+
+# 读取翻译相关配置（并发数、限流参数）
+def load_translation_settings():
+    config = load_config()
+    return {
+        "concurrency": config.getint('Translation', 'concurrency', fallback=DEFAULT_TRANSLATION_CONCURRENCY),
+        "requests_per_minute": config.getint('Translation', 'requests_per_minute', fallback=DEFAULT_REQUESTS_PER_MINUTE),
+        "burst": config.getint('Translation', 'burst', fallback=DEFAULT_RATE_LIMIT_BURST),
+        "stream": config.getboolean('Translation', 'stream', fallback=True),
+        "overlap_transcription": config.getboolean('Translation', 'overlap_transcription', fallback=True),
+    }
+
+_translation_settings = load_translation_settings()
+deepseek_rate_limiter = TokenBucketRateLimiter(
+    _translation_settings["requests_per_minute"], _translation_settings["burst"]
+)
+# openai 后端（本地/自建服务）单独限流，未配置时沿用[Translation]的参数
+_openai_config = load_config()
+openai_rate_limiter = TokenBucketRateLimiter(
+    _openai_config.getint('OpenAI', 'requests_per_minute', fallback=_translation_settings["requests_per_minute"]),
+    _openai_config.getint('OpenAI', 'burst', fallback=_translation_settings["burst"])
+)
+
+# 解析Retry-After响应头（秒数或HTTP日期）
+def parse_retry_after(value):
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        from email.utils import parsedate_to_datetime
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+DEEPSEEK_MODEL = "deepseek-chat"
+MAX_OUTPUT_TOKENS = 4096
+STREAM_READ_TIMEOUT = 30  # 流式模式下两段数据之间的最长等待秒数
+
+# 目标语言：代码 -> (提示词中的语言名, 字幕轨语言代码ISO 639-2, 提示词示例译文)
+TARGET_LANGUAGES = {
+    "zh": ("Simplified Chinese", "chi", ("你好世界", "早上好")),
+    "zh-TW": ("Traditional Chinese", "chi", ("你好世界", "早安")),
+    "en": ("English", "eng", ("Hello world", "Good morning")),
+    "ja": ("Japanese", "jpn", ("こんにちは世界", "おはようございます")),
+    "ko": ("Korean", "kor", ("안녕 세상", "좋은 아침")),
+    "fr": ("French", "fre", ("Bonjour le monde", "Bonjour")),
+    "de": ("German", "ger", ("Hallo Welt", "Guten Morgen")),
+    "es": ("Spanish", "spa", ("Hola mundo", "Buenos días")),
+    "ru": ("Russian", "rus", ("Привет, мир", "Доброе утро")),
+}
+DEFAULT_TARGET_LANG = "zh"
+
+# 优化后的系统提示词 - 更严格的格式控制，每条字幕以ID作为键
+TRANSLATION_SYSTEM_PROMPT_TEMPLATE = """
+    You are an expert subtitle translator. You will receive a JSON object that maps IDs to texts.
+    Translate each text into natural, fluent {language} without any extra explanations.
+    
+    RULES:
+    1. Output MUST be a JSON object with a single key: "translations"
+    2. "translations" must be an object mapping EVERY input ID to its translation
+    3. Use exactly the input IDs as keys; do not add, drop or renumber IDs
+    4. Do NOT merge or split any items
+    5. Each translation should be concise and match the original length
+    
+    Example Input:
+    {{"1": "Hello world", "2": "Good morning"}}
+    
+    Example Output:
+    {{"translations": {{"1": "{example_1}", "2": "{example_2}"}}}}
+    """
+
+# 生成指定目标语言的系统提示词
+def translation_system_prompt(target_lang=DEFAULT_TARGET_LANG):
+    if target_lang not in TARGET_LANGUAGES:
+        raise ValueError(f"不支持的目标语言: {target_lang}")
+    language, _, (example_1, example_2) = TARGET_LANGUAGES[target_lang]
+    return TRANSLATION_SYSTEM_PROMPT_TEMPLATE.format(language=language, example_1=example_1, example_2=example_2)
+
+TRANSLATION_SYSTEM_PROMPT = translation_system_prompt()
+
+# 解析逗号分隔的目标语言列表，例如 "zh, en, ja"
+def parse_target_languages(value):
+    langs = []
+    for lang in re.split(r'[,\s]+', value.strip()):
+        if not lang:
+            continue
+        if lang not in TARGET_LANGUAGES:
+            raise ValueError(f"不支持的目标语言: {lang}（可选: {', '.join(TARGET_LANGUAGES)}）")
+        if lang not in langs:
+            langs.append(lang)
+    return langs or [DEFAULT_TARGET_LANG]
+
+# 读取默认的目标语言列表
+def load_target_languages():
+    config = load_config()
+    return parse_target_languages(config.get('Translation', 'target_languages', fallback=DEFAULT_TARGET_LANG))
+
+# 增量解析流式返回的 {"translations": {"1": "...", ...}}，每条译文完整后立即产出
+# 兼容模型仍按数组返回的情况（按位置编号）
+class StreamingTranslationsParser:
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.container = None  # "{" 或 "["
+        self.done = False
+        self.items = {}  # 条目序号(从0开始) -> 译文
+        self.next_position = 0
+
+    def feed(self, chunk):
+        """追加一段内容，返回本次新解析出的 [(序号, 译文), ...]"""
+        self.buffer += chunk
+        new_items = []
+        if self.container is None:
+            match = re.search(r'"translations"\s*:\s*([\[{])', self.buffer)
+            if not match:
+                return new_items
+            self.container = match.group(1)
+            self.pos = match.end()
+        while not self.done:
+            pos = self._skip(self.pos, " \t\r\n,")
+            if pos >= len(self.buffer):
+                break
+            if self.buffer[pos] in "]}":
+                self.done = True
+                break
+            if self.container == "{":
+                key_end = self._string_end(pos)
+                if key_end is None:
+                    break
+                key = json.loads(self.buffer[pos:key_end+1])
+                pos = self._skip(key_end + 1, " \t\r\n")
+                if pos >= len(self.buffer):
+                    break
+                if self.buffer[pos] != ":":
+                    raise ValueError("Unexpected token in translations object")
+                pos = self._skip(pos + 1, " \t\r\n")
+            value_end = self._string_end(pos)
+            if value_end is None:
+                break  # 字符串还没接收完整
+            value = json.loads(self.buffer[pos:value_end+1])
+            if self.container == "{":
+                index = int(key) - 1 if str(key).isdigit() else None
+            else:
+                index = self.next_position
+                self.next_position += 1
+            if index is not None and index >= 0:
+                self.items[index] = value
+                new_items.append((index, value))
+            self.pos = value_end + 1
+        return new_items
+
+    def _skip(self, pos, chars):
+        while pos < len(self.buffer) and self.buffer[pos] in chars:
+            pos += 1
+        return pos
+
+    def _string_end(self, start):
+        if start >= len(self.buffer):
+            return None
+        if self.buffer[start] != '"':
+            raise ValueError("Unexpected token in translations")
+        i = start + 1
+        while i < len(self.buffer):
+            if self.buffer[i] == "\\":
+                i += 2
+                continue
+            if self.buffer[i] == '"':
+                return i
+            i += 1
+        return None
+
+# 按ID逐条校验译文，返回 (有效条目 [(序号, 译文)], 缺失或无效的序号)
+def validate_translations(translations, text_list):
+    if isinstance(translations, list):
+        # 数组无法确认对应关系，只有条数完全一致时才接受
+        if len(translations) != len(text_list):
+            return [], list(range(len(text_list)))
+        translations = {i: t for i, t in enumerate(translations)}
+    elif isinstance(translations, dict):
+        translations = {int(k) - 1: v for k, v in translations.items() if str(k).strip().isdigit()}
+    else:
+        raise ValueError("'translations' must be an object keyed by ID")
+    translated_items = []
+    missing_indices = []
+    for i, source in enumerate(text_list):
+        text = translations.get(i)
+        if isinstance(text, str) and (text.strip() or not source.strip()):
+            translated_items.append((i, text))
+        else:
+            missing_indices.append(i)
+    return translated_items, missing_indices
+
+# 检查429限流，暂停该后端的共享限流器后抛出RateLimitError
+def check_rate_limit(response, rate_limiter=None):
+    if response.status_code == 429:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if rate_limiter is not None:
+            rate_limiter.pause(retry_after)
+        raise RateLimitError(f"Rate limited, retry after {retry_after:.0f}s", retry_after,
+                             paused=rate_limiter is not None)
+
+# 以SSE流式方式请求翻译，中断时保留已收到的条目
+def request_translations_streaming(url, headers, data, text_list, on_item=None, rate_limiter=None):
+    import requests
+    parser = StreamingTranslationsParser()
+    finish_reason = None
+    try:
+        # include_usage：最后一个数据块携带本次请求的tokens用量
+        stream_data = dict(data, stream=True, stream_options={"include_usage": True})
+        with requests.post(url, headers=headers, json=stream_data, stream=True,
+                           timeout=(10, STREAM_READ_TIMEOUT)) as response:
+            check_rate_limit(response, rate_limiter)
+            response.raise_for_status()
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue  # 跳过空行和keep-alive注释
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                record_usage(data.get("model"), chunk.get("usage"))
+                if not chunk.get("choices"):
+                    continue  # 只携带usage的数据块
+                choice = chunk["choices"][0]
+                for idx, item in parser.feed(choice.get("delta", {}).get("content") or ""):
+                    if on_item and idx < len(text_list) and isinstance(item, str) and item.strip():
+                        on_item(idx, item)
+                finish_reason = choice.get("finish_reason") or finish_reason
+    except requests.exceptions.RequestException as e:
+        if not parser.items:
+            raise
+        logging.warning(f"Stream interrupted after {len(parser.items)} items: {str(e)}")
+        finish_reason = "interrupted"
+
+    if parser.done and finish_reason != "length":
+        if parser.container == "[":
+            return [parser.items[i] for i in sorted(parser.items)]
+        return {str(i + 1): text for i, text in parser.items.items()}
+    if not parser.items:
+        if finish_reason == "length":
+            raise TruncatedResponseError(f"Output hit max_tokens with {len(text_list)} items")
+        raise ValueError("Missing 'translations' key in response")
+    # 超时、断线或被截断：保留已完成的条目，其余交由调用方重发
+    translated_items, missing_indices = validate_translations(
+        {str(i + 1): text for i, text in parser.items.items()}, text_list
+    )
+    raise PartialTranslationError(
+        f"Stream {finish_reason or 'ended early'}: Got {len(translated_items)} of {len(text_list)}",
+        translated_items,
+        missing_indices
+    )
+
+# 翻译后端：任何兼容OpenAI Chat Completions接口的服务
+class OpenAICompatibleBackend:
+    name = "openai"
+
+    def __init__(self, api_url, model, api_key="", rate_limiter=None, json_mode=True, stream=None,
+                 target_lang=DEFAULT_TARGET_LANG):
+        self.api_url = api_url
+        self.model = model
+        self.api_key = api_key
+        self.target_lang = target_lang
+        self.system_prompt = translation_system_prompt(target_lang)
+        self.rate_limiter = rate_limiter
+        self.json_mode = json_mode
+        self.stream = stream
+
+    def translate(self, text_list, batch_id=None, stream=None, on_item=None):
+        """
+        Translates a list of texts with enhanced error handling and partial
+        result recovery. Texts are sent as an ID->text object and the reply is
+        validated per ID, so a merged or dropped item only marks that ID as
+        missing instead of shifting the rest. In streaming mode each finished
+        item is passed to on_item(index, text) as soon as it has been parsed,
+        and an interrupted stream raises PartialTranslationError with the items
+        received so far.
+        """
+        url = self.api_url
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        if stream is None:
+            stream = self.stream if self.stream is not None else load_translation_settings()["stream"]
+        
+        # 添加批次ID到用户内容帮助模型跟踪上下文
+        batch_header = f"Batch ID: {batch_id}\n" if batch_id else ""
+        user_content = batch_header + json.dumps(
+            {str(i + 1): text for i, text in enumerate(text_list)}, ensure_ascii=False
+        )
+
+        data = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": user_content}
+            ],
+            "temperature": 0.1,
+            "top_p": 0.85,
+            "max_tokens": MAX_OUTPUT_TOKENS,  # 确保最大token设置
+        }
+        if self.json_mode:
+            data["response_format"] = {"type": "json_object"}
+        
+        import requests
+        response_text = ""
+        try:
+            # 增加超时和重试逻辑
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            if stream:
+                translated_list = request_translations_streaming(
+                    url, headers, data, text_list, on_item, self.rate_limiter
+                )
+            else:
+                response = requests.post(url, headers=headers, json=data, timeout=120)
+                check_rate_limit(response, self.rate_limiter)
+                response.raise_for_status()
+                
+                response_json = response.json()
+                record_usage(self.model, response_json.get("usage"))
+                response_text = response_json["choices"][0]["message"]["content"]
+                if response_json["choices"][0].get("finish_reason") == "length":
+                    raise TruncatedResponseError(f"Output hit max_tokens with {len(text_list)} items")
+                
+                # 处理可能的非JSON响应
+                if not response_text.strip().startswith("{"):
+                    # 尝试提取可能的JSON部分
+                    json_start = response_text.find("{")
+                    json_end = response_text.rfind("}") + 1
+                    if json_start != -1 and json_end != 0:
+                        response_text = response_text[json_start:json_end]
+                
+                parsed_json = json.loads(response_text)
+                
+                # 增强的错误处理
+                if 'error' in parsed_json:
+                    error_msg = parsed_json.get('error', {}).get('message', 'Unknown API error')
+                    raise ValueError(f"API error: {error_msg}")
+                    
+                if 'translations' not in parsed_json:
+                    raise ValueError("Missing 'translations' key in response")
+                    
+                translated_list = parsed_json['translations']
+            
+            # 按ID逐条校验，缺失或无效的ID交由调用方修复
+            translated_items, missing_indices = validate_translations(translated_list, text_list)
+            if missing_indices:
+                raise PartialTranslationError(
+                    f"Partial translation: Got {len(translated_items)} of {len(text_list)}",
+                    translated_items,
+                    missing_indices
+                )
+            
+            return [text for _, text in translated_items]
+            
+        except (json.JSONDecodeError, KeyError) as e:
+            logging.error(f"JSON parsing failed: {str(e)}")
+            logging.error(f"API response: {response_text[:500]}")
+            raise ValueError("Failed to parse API response as JSON") from e
+            
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Network error: {str(e)}")
+            raise ValueError(f"Network error: {e}") from e
+            
+        except Exception as e:
+            logging.error(f"Unexpected error: {str(e)}")
+            raise
+
+# DeepSeek后端，所有任务共享同一个限流器
+class DeepSeekBackend(OpenAICompatibleBackend):
+    name = "deepseek"
+
+    def __init__(self, api_key, stream=None, target_lang=DEFAULT_TARGET_LANG):
+        super().__init__(DEEPSEEK_API_URL, DEEPSEEK_MODEL, api_key, deepseek_rate_limiter, stream=stream,
+                         target_lang=target_lang)
+
+# 按名称创建翻译后端：deepseek 或 openai（本地/自建的兼容接口）
+def create_translation_backend(api_key, name=None, target_lang=DEFAULT_TARGET_LANG):
+    config = load_config()
+    name = name or config.get('Translation', 'backend', fallback='deepseek')
+    if name == "deepseek":
+        return DeepSeekBackend(api_key, target_lang=target_lang)
+    if name == "openai":
+        return OpenAICompatibleBackend(
+            config.get('OpenAI', 'api_url', fallback='http://localhost:8000/v1/chat/completions'),
+            config.get('OpenAI', 'model', fallback='default'),
+            config.get('OpenAI', 'api_key', fallback=''),
+            openai_rate_limiter,
+            json_mode=config.getboolean('OpenAI', 'json_mode', fallback=True),
+            target_lang=target_lang
+        )
+    raise ValueError(f"未知的翻译后端: {name}")
+
+# 对冲请求：批次耗时超过历史延迟的指定分位数时，再发一个副本，取先返回的结果
+class HedgedTranslator:
+    MIN_SAMPLES = 10
+    WORK_OVERHEAD = 50  # 每个请求的固定token开销，用于按工作量归一化延迟
+
+    def __init__(self, primary, hedge_backend=None, percentile=95, max_workers=16):
+        self.primary = primary
+        self.hedge_backend = hedge_backend or primary
+        self.model = primary.model
+        self.target_lang = primary.target_lang
+        self.percentile = percentile
+        self.latencies = deque(maxlen=200)  # 每单位工作量的耗时
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _threshold(self, work):
+        with self.lock:
+            if len(self.latencies) < self.MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        rank = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[rank] * work
+
+    def _submit(self, backend, work, text_list, batch_id, on_item):
+        started = time.monotonic()
+        future = self.executor.submit(with_current_metrics(backend.translate), text_list, batch_id, None, on_item)
+
+        def record(f):
+            if not f.cancelled() and f.exception() is None:
+                with self.lock:
+                    self.latencies.append((time.monotonic() - started) / work)
+        future.add_done_callback(record)
+        return future
+
+    def translate(self, text_list, batch_id=None, stream=None, on_item=None):
+        work = sum(estimate_tokens(text) for text in text_list) + self.WORK_OVERHEAD
+        with self.lock:
+            self.requests += 1
+        threshold = self._threshold(work)
+        # 本批次返回后，仍在运行的主请求不再回调on_item（对冲副本先返回时，主请求的流式条目不能再写入日志和下游）
+        settled = False
+        settled_lock = threading.Lock()
+
+        def guarded_on_item(*args):
+            with settled_lock:
+                if not settled:
+                    on_item(*args)
+
+        primary = self._submit(self.primary, work, text_list, batch_id, guarded_on_item if on_item else None)
+        try:
+            if threshold is None or wait([primary], timeout=threshold).done:
+                return primary.result()
+
+            # 主请求超时未返回，发送对冲副本（副本不回调on_item，避免重复写入）
+            with self.lock:
+                self.hedges += 1
+            hedge = self._submit(self.hedge_backend, work, text_list, batch_id, None)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            with self.lock:
+                                self.hedge_wins += 1
+                        return future.result()
+            return primary.result()  # 两者都失败时抛出主请求的异常
+        finally:
+            with settled_lock:
+                settled = True
+
+    def stats(self):
+        with self.lock:
+            hedge_rate = self.hedges / self.requests * 100 if self.requests else 0.0
+            win_rate = self.hedge_wins / self.hedges * 100 if self.hedges else 0.0
+            return (f"Hedging: {self.hedges}/{self.requests} requests hedged ({hedge_rate:.1f}%), "
+                    f"hedge won {self.hedge_wins} ({win_rate:.1f}%)")
+
+_hedged_translators = {}
+_hedged_translators_lock = threading.Lock()
+
+# 创建翻译器：按配置选择后端，开启对冲时包装为HedgedTranslator（同一配置在进程内复用，延迟统计可累积）
+def create_translator(api_key, target_lang=DEFAULT_TARGET_LANG):
+    config = load_config()
+    backend = create_translation_backend(api_key, target_lang=target_lang)
+    if not config.getboolean('Translation', 'hedge', fallback=False):
+        return backend
+    hedge_name = config.get('Translation', 'hedge_backend', fallback=backend.name)
+    percentile = config.getfloat('Translation', 'hedge_percentile', fallback=95)
+    key = (backend.name, hedge_name, percentile, api_key, target_lang)
+    with _hedged_translators_lock:
+        if key not in _hedged_translators:
+            _hedged_translators[key] = HedgedTranslator(
+                backend, create_translation_backend(api_key, hedge_name, target_lang), percentile
+            )
+        return _hedged_translators[key]
+
+#调用Deepseek进行翻译，批处理
+def translate_text_deepseek(text_list, api_key, batch_id=None, stream=None, on_item=None,
+                            target_lang=DEFAULT_TARGET_LANG):
+    """
+    Translates a list of texts with the DeepSeek backend. Kept as a shortcut
+    for callers that do not need a pluggable backend.
+    """
+    return DeepSeekBackend(api_key, target_lang=target_lang).translate(text_list, batch_id, stream, on_item)
+
+# 翻译记忆库：持久化到SQLite，重复内容不再调用API
+class TranslationMemory:
+    def __init__(self, db_path, max_entries=200000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tm (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                source_lang TEXT,
+                model TEXT,
+                prompt_hash TEXT,
+                last_used REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS tm_last_used ON tm(last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+
+    @classmethod
+    def make_key(cls, text, source_lang, model, prompt_hash):
+        raw = "\x1f".join([cls.normalize(text), source_lang or "", model, prompt_hash])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts, source_lang, model=DEEPSEEK_MODEL, prompt_hash=None):
+        """返回 {原文: 译文}，只包含命中的条目"""
+        prompt_hash = prompt_hash or translation_prompt_hash()
+        keys = {self.make_key(t, source_lang, model, prompt_hash): t for t in set(texts)}
+        found = {}
+        with self.lock:
+            key_list = list(keys)
+            for n in range(0, len(key_list), 500):
+                chunk = key_list[n:n+500]
+                rows = self.conn.execute(
+                    f"SELECT key, translation FROM tm WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, translation in rows:
+                    found[keys[key]] = translation
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE tm SET last_used = ? WHERE key = ?",
+                    [(now, self.make_key(t, source_lang, model, prompt_hash)) for t in found]
+                )
+                self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, pairs, source_lang, model=DEEPSEEK_MODEL, prompt_hash=None):
+        """写入 [(原文, 译文), ...]，超出上限时按最近使用时间淘汰"""
+        prompt_hash = prompt_hash or translation_prompt_hash()
+        now = time.time()
+        rows = [
+            (self.make_key(src, source_lang, model, prompt_hash), src, dst, source_lang, model, prompt_hash, now)
+            for src, dst in pairs if src and dst
+        ]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO tm VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM tm").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM tm WHERE key IN (SELECT key FROM tm ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def export_jsonl(self, path):
+        """导出全部条目为JSON Lines，返回导出条数"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT source, translation, source_lang, model, prompt_hash FROM tm ORDER BY last_used"
+            ).fetchall()
+        with open(path, "w", encoding="utf-8") as f:
+            for source, translation, source_lang, model, prompt_hash in rows:
+                f.write(json.dumps({
+                    "source": source, "translation": translation, "source_lang": source_lang,
+                    "model": model, "prompt_hash": prompt_hash
+                }, ensure_ascii=False) + "\n")
+        return len(rows)
+
+    def import_jsonl(self, path):
+        """从export_jsonl导出的文件预热，返回导入条数"""
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                self.put_many(
+                    [(item["source"], item["translation"])], item.get("source_lang"),
+                    item.get("model") or DEEPSEEK_MODEL, item.get("prompt_hash")
+                )
+                count += 1
+        return count
+
+    def warm_from_srt(self, source_srt, translated_srt, source_lang, target_lang=DEFAULT_TARGET_LANG, model=None):
+        """用已有的原文/译文SRT对预热，返回导入条数；model 默认为当前配置的翻译后端的模型（查询时按此匹配）"""
+        if model is None:
+            model = create_translation_backend("", target_lang=target_lang).model
+        sources = [block[2].replace('\n', ' ').strip() for block in parse_srt(source_srt)]
+        translations = [block[2].replace('\n', ' ').strip() for block in parse_srt(translated_srt)]
+        if len(sources) != len(translations):
+            raise ValueError("字幕条数不一致，无法导入翻译记忆")
+        pairs = [(s, t) for s, t in zip(sources, translations) if s != t]
+        self.put_many(pairs, source_lang, model=model, prompt_hash=translation_prompt_hash(target_lang))
+        return len(pairs)
+
+    def stats(self):
+        return f"Translation memory: {self.hits} hits, {self.misses} misses"
+
+# 提示词哈希，提示词变化后旧的翻译记忆自动失效；不同目标语言的译文互不干扰
+def translation_prompt_hash(target_lang=DEFAULT_TARGET_LANG):
+    return hashlib.sha256(translation_system_prompt(target_lang).encode("utf-8")).hexdigest()[:16]
+
+_translation_memory = None
+_translation_memory_lock = threading.Lock()
+
+# 获取进程内共享的翻译记忆库，配置关闭时返回None
+def get_translation_memory():
+    global _translation_memory
+    config = load_config()
+    if not config.getboolean('Cache', 'translation_memory', fallback=True):
+        return None
+    with _translation_memory_lock:
+        if _translation_memory is None:
+            path = os.path.expanduser(config.get('Cache', 'translation_memory_path', fallback='translation_memory.db'))
+            if not os.path.isabs(path):
+                # 相对路径放在缓存目录下，界面和命令行无论从哪个目录启动都使用同一个记忆库；
+                # 旧版本在当前目录下创建的记忆库复制过去继续使用
+                legacy_path = os.path.abspath(path)
+                path = os.path.join(get_cache_dir(), path)
+                if not os.path.exists(path) and os.path.exists(legacy_path):
+                    shutil.copyfile(legacy_path, path)
+            _translation_memory = TranslationMemory(
+                path,
+                config.getint('Cache', 'translation_memory_max_entries', fallback=200000)
+            )
+    return _translation_memory
+
+# 翻译日志：每完成一个批次追加一行 {序号, 原文哈希, 译文}，用于中断后续传
+class TranslationJournal:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    @staticmethod
+    def source_hash(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+    def load(self, original_texts):
+        """返回 {原文: 译文}，只保留序号和原文哈希都与当前输入一致的条目"""
+        resumed = {}
+        if not os.path.exists(self.path):
+            return resumed
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    idx = entry["index"]
+                    text = entry["text"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue  # 崩溃时可能留下写了一半的最后一行
+                # 字段类型不对的行同样跳过，不中断续传
+                if not isinstance(idx, int) or isinstance(idx, bool) or not isinstance(text, str):
+                    continue
+                if 0 <= idx < len(original_texts) and entry.get("src_hash") == self.source_hash(original_texts[idx]):
+                    resumed[original_texts[idx]] = text
+        return resumed
+
+    def append(self, entries):
+        """追加 [(序号, 原文, 译文), ...] 并立即落盘"""
+        if not entries:
+            return
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+        for idx, source, translation in entries:
+            self.file.write(json.dumps(
+                {"index": idx, "src_hash": self.source_hash(source), "text": translation}, ensure_ascii=False
+            ) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+SRT_PATTERN = re.compile(r'(\d+)\n(\d{2}:\d{2}:\d{2},\d{3} --> \d{2}:\d{2}:\d{2},\d{3})\n([\s\S]*?)(?=\n\n|\Z)', re.MULTILINE)
+
+# 解析SRT文件，返回 [(序号, 时间轴, 文本), ...]
+def parse_srt(path):
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    return SRT_PATTERN.findall(content)
+
+# 格式化SRT时间戳，与whisper的SRT输出一致
+def format_srt_timestamp(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
+
+# 解析SRT时间戳为秒
+def parse_srt_timestamp(timestamp):
+    h, m, s_ms = timestamp.strip().split(":")
+    secs, millis = s_ms.split(",")
+    return int(h) * 3600 + int(m) * 60 + int(secs) + int(millis) / 1000
+
+# 读取SRT字幕，返回 [(开始秒, 结束秒, 文本), ...]
+def load_srt_cues(path):
+    cues = []
+    for _, timeline, text in parse_srt(path):
+        start, end = timeline.split(" --> ")
+        cues.append((parse_srt_timestamp(start), parse_srt_timestamp(end), text))
+    return cues
+
+# 写出SRT文件，segments 为 [(开始秒, 结束秒, 文本), ...]
+def write_srt(segments, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for idx, (start, end, text) in enumerate(segments, start=1):
+            f.write(f"{idx}\n")
+            f.write(f"{format_srt_timestamp(start)} --> {format_srt_timestamp(end)}\n")
+            f.write(f"{text.strip().replace('-->', '->')}\n\n")
+
+# 默认放行规则：纯数字、标点、符号（如 "♪"、"..."、"123"）无需翻译
+DEFAULT_SKIP_PATTERNS = [r'^[\W\d_]*$']
+
+# 读取放行规则，config.ini 中每行一个正则表达式
+def load_skip_patterns():
+    config = load_config()
+    raw = config.get('Translation', 'skip_patterns', raw=True, fallback=None)
+    patterns = [line.strip() for line in raw.splitlines() if line.strip()] if raw is not None else DEFAULT_SKIP_PATTERNS
+    return [re.compile(pattern) for pattern in patterns]
+
+def needs_no_translation(text, skip_patterns):
+    return any(pattern.search(text) for pattern in skip_patterns)
+
+# 重试参数
+MAX_RETRIES = 3
+MAX_RATE_LIMIT_RETRIES = 5
+MAX_REPAIR_ROUNDS = 2
+
+# 估算文本的token数：中日韩字符约1个token，其余字符约3.5个字符1个token
+def estimate_tokens(text):
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return max(1, int(cjk + (len(text) - cjk) / 3.5 + 0.5))
+
+# 按token预算组批，并根据截断/部分返回的情况自适应调整预算
+class TokenBudgetBatcher:
+    OUTPUT_RATIO = 1.5      # 译文token数相对原文的估计倍数
+    ITEM_OVERHEAD = 4       # 每条在JSON中的引号、逗号等开销
+    MAX_ITEMS = 80          # 单批条数上限，避免条目过多导致错位
+
+    def __init__(self, max_output_tokens=MAX_OUTPUT_TOKENS, initial_ratio=0.5):
+        self.max_target = int(max_output_tokens * 0.8)
+        self.min_target = max(64, max_output_tokens // 32)
+        self.target = int(max_output_tokens * initial_ratio)
+
+    def estimate_output(self, text):
+        return int(estimate_tokens(text) * self.OUTPUT_RATIO) + self.ITEM_OVERHEAD
+
+    def take(self, texts):
+        """返回从texts开头起能放进当前预算的条数（至少1条）"""
+        budget = 0
+        count = 0
+        for text in texts[:self.MAX_ITEMS]:
+            cost = self.estimate_output(text)
+            if count and budget + cost > self.target:
+                break
+            budget += cost
+            count += 1
+        return max(1, count)
+
+    def record(self, failures, truncated):
+        if truncated:
+            self.target = max(self.min_target, int(self.target * 0.6))
+        elif failures:
+            self.target = max(self.min_target, int(self.target * 0.8))
+        else:
+            self.target = min(self.max_target, int(self.target * 1.1))
+
+def translate_batch(batch_originals, batch_indices, batch_num, translator, log_signal, on_item=None):
+    """
+    Translates one batch with retries, partial-result recovery and line-by-line
+    fallback. batch_indices are the cue indices of batch_originals, used for
+    logging. on_item(source_text, translation) is called for every item as soon
+    as a streamed response yields it. Returns (translations, failures,
+    truncated): lines that could not be translated at all are None, failures is
+    the number of failed attempts and truncated tells whether the output limit
+    was hit or the reply came back short, so the batcher can shrink its budget.
+    """
+    results = [None] * len(batch_originals)
+    label = f"{batch_indices[0]+1}-{batch_indices[-1]+1}"
+    started = time.monotonic()
+    retry_count = 0
+    rate_limit_count = 0
+    truncated = False
+    success = False
+
+    while not success and retry_count < MAX_RETRIES:
+        try:
+            log_signal.emit(f"[INFO] Translating batch {batch_num} ({label}), size={len(batch_originals)}")
+
+            # 添加批次ID帮助跟踪
+            batch_translated = translator.translate(
+                batch_originals,
+                batch_id=label,
+                on_item=(lambda j, text: on_item(batch_originals[j], text)) if on_item else None
+            )
+
+            # 成功获取完整批次
+            for j in range(len(batch_originals)):
+                results[j] = batch_translated[j]
+
+            log_signal.emit(f"[SUCCESS] Batch {batch_num} completed")
+            success = True
+
+        except PartialTranslationError as e:
+            # 处理部分成功的情况
+            log_signal.emit(f"[WARN] Partial translation: {len(e.translated_items)}/{len(batch_originals)} succeeded")
+            truncated = True
+
+            # 填充已翻译的部分
+            for idx, text in e.translated_items:
+                results[idx] = text
+
+            # 只把缺失或无效的ID放进一个小的修复批次重发
+            repair_missing_items(batch_originals, batch_indices, results, e.missing_indices,
+                                 label, translator, log_signal, on_item)
+            success = True
+
+        except TruncatedResponseError as e:
+            # 输出被截断：对半拆分后立即重发，不做退避等待
+            truncated = True
+            if len(batch_originals) > 1:
+                log_signal.emit(f"[WARN] Batch {batch_num} truncated, splitting into halves")
+                record_metric("split", batch=label, size=len(batch_originals))
+                half = len(batch_originals) // 2
+                for part in (slice(0, half), slice(half, None)):
+                    part_results, part_failures, _ = translate_batch(
+                        batch_originals[part], batch_indices[part], batch_num, translator, log_signal, on_item
+                    )
+                    results[part] = part_results
+                    retry_count += part_failures
+                return results, retry_count, truncated
+            retry_count = MAX_RETRIES
+            log_signal.emit(f"[ERROR] Batch {batch_num} truncated: {str(e)}")
+
+        except RateLimitError as e:
+            # 限流不计入失败次数，等待由共享限流器统一处理；后端没有限流器时在这里等待
+            rate_limit_count += 1
+            record_metric("rate_limited", batch=label, retry_after=e.retry_after)
+            if rate_limit_count > MAX_RATE_LIMIT_RETRIES:
+                retry_count = MAX_RETRIES
+                log_signal.emit(f"[ERROR] Batch {batch_num} rate limited too many times")
+            else:
+                log_signal.emit(f"[WARN] Batch {batch_num} rate limited, waiting {e.retry_after:.0f} seconds...")
+                if not e.paused:
+                    time.sleep(e.retry_after)
+                continue
+
+        except Exception as e:
+            retry_count += 1
+            wait_time = 2 ** retry_count  # 指数退避
+            record_metric("retry", batch=label, attempt=retry_count, error=str(e)[:200])
+
+            if retry_count < MAX_RETRIES:
+                log_signal.emit(f"[WARN] Batch {batch_num} failed (attempt {retry_count}/{MAX_RETRIES}): {str(e)}")
+                log_signal.emit(f"[INFO] Retrying in {wait_time} seconds...")
+                time.sleep(wait_time)
+                continue
+            log_signal.emit(f"[ERROR] Batch {batch_num} failed after {MAX_RETRIES} attempts")
+
+        if not success and retry_count >= MAX_RETRIES:
+            # 回退到逐行翻译
+            for j in range(len(batch_originals)):
+                results[j] = translate_single_line(batch_originals[j], batch_indices[j], translator, log_signal)
+            success = True
+
+    record_metric("batch", batch=label, size=len(batch_originals), seconds=round(time.monotonic() - started, 3),
+                  retries=retry_count, rate_limited=rate_limit_count, truncated=truncated,
+                  untranslated=sum(1 for r in results if r is None))
+    return results, retry_count, truncated
+
+# 修复批次：只重发缺失/无效的ID，多轮后仍缺失的才逐行翻译
+def repair_missing_items(batch_originals, batch_indices, results, missing_indices,
+                         label, translator, log_signal, on_item=None):
+    missing = list(missing_indices)
+    for round_num in range(1, MAX_REPAIR_ROUNDS + 1):
+        if not missing:
+            return
+        log_signal.emit(f"[INFO] Repairing {len(missing)} missing IDs (round {round_num}/{MAX_REPAIR_ROUNDS})")
+        record_metric("repair", batch=label, ids=len(missing), round=round_num)
+        items = [batch_originals[idx] for idx in missing]
+        try:
+            repaired = translator.translate(
+                items,
+                batch_id=f"REPAIR-{label}",
+                on_item=(lambda j, text, m=missing: on_item(batch_originals[m[j]], text)) if on_item else None
+            )
+            for k, idx in enumerate(missing):
+                results[idx] = repaired[k]
+            missing = []
+            log_signal.emit(f"[SUCCESS] Missing items translated")
+        except PartialTranslationError as e:
+            for k, text in e.translated_items:
+                results[missing[k]] = text
+            missing = [missing[k] for k in e.missing_indices]
+        except Exception as repair_e:
+            log_signal.emit(f"[ERROR] Repair failed: {str(repair_e)}")
+            break
+
+    # 修复仍失败时回退到单行翻译
+    for idx in missing:
+        results[idx] = translate_single_line(batch_originals[idx], batch_indices[idx], translator, log_signal)
+
+# 单行翻译，失败时返回None（由调用方使用原文）
+def translate_single_line(text, line_index, translator, log_signal):
+    try:
+        single_result = translator.translate([text])
+        log_signal.emit(f"[INFO] Translated line {line_index+1} individually")
+        record_metric("fallback", line=line_index + 1, ok=True)
+        return single_result[0]
+    except Exception:
+        log_signal.emit(f"[WARN] Using original for line {line_index+1}")
+        record_metric("fallback", line=line_index + 1, ok=False)
+        return None
+
+def translate_srt_file(input_srt, output_srt, api_key, log_signal, concurrency=None,
+                       source_lang=None, translation_memory=None, translator=None,
+                       cancel_check=None, known_translations=None, target_lang=DEFAULT_TARGET_LANG):
+    """
+    Enhanced SRT translation with token-budget batching and automatic retry.
+    Cues matching the skip patterns are passed through, identical source texts
+    are sent once and fanned back out, and texts already in the translation
+    memory are filled in before any batch is built. Up to `concurrency` batches
+    are kept in flight at once; every request goes through the process-wide
+    token bucket, and results are written back by cue index so the output order
+    never depends on completion order.
+
+    known_translations ({source: translation}, e.g. produced while Whisper was
+    still running or by a preview) are applied first and never re-sent. Every finished batch is
+    appended to a journal next to output_srt, so a run that crashes or is
+    cancelled resumes where it stopped. The target language comes from
+    translator when one is given, otherwise from target_lang. Returns False if
+    cancel_check() asked to stop before all cues were translated.
+    """
+    srt_blocks = parse_srt(input_srt)
+    original_texts = [block[2].replace('\n', ' ').strip() for block in srt_blocks]
+    translated_texts = [""] * len(original_texts)  # 预填充空结果
+
+    if concurrency is None:
+        concurrency = load_translation_settings()["concurrency"]
+    concurrency = max(1, concurrency)
+    if translation_memory is None:
+        translation_memory = get_translation_memory()
+    if translator is None:
+        translator = create_translator(api_key, target_lang)
+    prompt_hash = translation_prompt_hash(translator.target_lang)
+
+    # 预处理：按规则放行无需翻译的条目，相同原文只翻译一次
+    skip_patterns = load_skip_patterns()
+    occurrences = {}  # 原文 -> 出现该原文的所有条目序号
+    skipped = 0
+    for idx, text in enumerate(original_texts):
+        if needs_no_translation(text, skip_patterns):
+            translated_texts[idx] = text
+            skipped += 1
+        else:
+            occurrences.setdefault(text, []).append(idx)
+    pending_texts = list(occurrences)
+    log_signal.emit(
+        f"[INFO] {skipped} cues passed through by rules, "
+        f"{len(original_texts) - skipped - len(pending_texts)} duplicate cues collapsed"
+    )
+
+    # 将一条译文分发到该原文的所有出现位置（流式返回时每条译文到达即写入）
+    def fan_out(text, translation):
+        for idx in occurrences[text]:
+            translated_texts[idx] = translation
+
+    # 转写期间已完成的译文直接使用
+    if known_translations:
+        known = [text for text in pending_texts if text in known_translations]
+        for text in known:
+            fan_out(text, known_translations[text])
+        pending_texts = [text for text in pending_texts if text not in known_translations]
+        log_signal.emit(f"[INFO] {len(known)} unique cues already translated during transcription or preview")
+
+    # 从上次中断留下的日志中恢复已完成的条目
+    journal = TranslationJournal(output_srt + ".journal.jsonl")
+    resumed = journal.load(original_texts)
+    if resumed:
+        for text, translation in resumed.items():
+            if text in occurrences:
+                fan_out(text, translation)
+        pending_texts = [text for text in pending_texts if text not in resumed]
+        log_signal.emit(f"[INFO] Resumed {len(resumed)} unique cues from {os.path.basename(journal.path)}")
+
+    # 先查翻译记忆库，命中的条目不再进入批次
+    if translation_memory is not None:
+        cached = translation_memory.get_many(pending_texts, source_lang, translator.model, prompt_hash)
+        for text, translation in cached.items():
+            fan_out(text, translation)
+        pending_texts = [text for text in pending_texts if text not in cached]
+        log_signal.emit(f"[INFO] {len(cached)} unique cues served from translation memory")
+
+    batcher = TokenBudgetBatcher()
+    batch_num = 0
+    log_signal.emit(f"[INFO] Translating {len(pending_texts)} unique cues with concurrency={concurrency}")
+
+    cancelled = False
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+        i = 0
+        while (i < len(pending_texts) and not cancelled) or pending:
+            if cancel_check is not None and cancel_check():
+                cancelled = True  # 不再提交新批次，等待在途批次完成并写入日志
+            # 保持最多 concurrency 个批次同时在途，按提交时的token预算组批
+            while i < len(pending_texts) and len(pending) < concurrency and not cancelled:
+                batch_texts = pending_texts[i:i+batcher.take(pending_texts[i:i+batcher.MAX_ITEMS])]
+                batch_num += 1
+                future = executor.submit(
+                    with_current_metrics(translate_batch), batch_texts,
+                    [occurrences[text][0] for text in batch_texts], batch_num, translator, log_signal, fan_out
+                )
+                pending[future] = batch_texts
+                i += len(batch_texts)
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch_texts = pending.pop(future)
+                batch_translated, failures, truncated = future.result()
+                # 按原始序号写回，保证顺序；翻译失败的行使用原文
+                new_pairs = []
+                for text, translation in zip(batch_texts, batch_translated):
+                    if translation is None:
+                        fan_out(text, text)
+                    else:
+                        fan_out(text, translation)
+                        new_pairs.append((text, translation))
+                journal.append([(idx, text, translation) for text, translation in new_pairs
+                                for idx in occurrences[text]])
+                if translation_memory is not None:
+                    translation_memory.put_many(new_pairs, source_lang, translator.model, prompt_hash)
+
+                # 截断或失败时收缩token预算，成功时逐步放宽
+                batcher.record(failures, truncated)
+
+    journal.close()
+    if translation_memory is not None:
+        log_signal.emit(f"[INFO] {translation_memory.stats()}")
+    if isinstance(translator, HedgedTranslator):
+        log_signal.emit(f"[INFO] {translator.stats()}")
+    if cancelled:
+        log_signal.emit(f"[INFO] Translation cancelled, progress kept in {os.path.basename(journal.path)}")
+        return False
+
+    # 写入翻译后的SRT文件
+    with open(output_srt, "w", encoding="utf-8") as f:
+        for idx, block in enumerate(srt_blocks):
+            if idx < len(translated_texts):
+                f.write(f"{block[0]}\n")
+                f.write(f"{block[1]}\n")
+                f.write(f"{translated_texts[idx]}\n\n")
+            else:
+                f.write(f"{block[0]}\n")
+                f.write(f"{block[1]}\n")
+                f.write(f"{block[2]}\n\n")  # 使用原始文本作为后备
+    journal.remove()  # 输出已完整写入，日志不再需要
+    return True
+
+# ---------------- 运行指标 ----------------
+
+# 读取运行指标相关配置
+def load_metrics_settings():
+    config = load_config()
+    metrics_dir = config.get('Metrics', 'metrics_dir', fallback='').strip()
+    prometheus_file = config.get('Metrics', 'prometheus_file', fallback='').strip()
+    profile = config.get('Metrics', 'profile', fallback='off').strip().lower()
+    if profile not in ("off", "cprofile", "tracemalloc"):
+        raise ValueError(f"不支持的 profile: {profile}（可选 off、cprofile、tracemalloc）")
+    return {
+        "enabled": config.getboolean('Metrics', 'enabled', fallback=True),
+        "metrics_dir": os.path.expanduser(metrics_dir) if metrics_dir else get_cache_dir("metrics"),
+        "prometheus_file": os.path.expanduser(prometheus_file) if prometheus_file else None,
+        "profile": profile,
+    }
+
+_metrics_local = threading.local()
+
+# 当前线程绑定的任务指标，没有时返回None
+def current_metrics():
+    return getattr(_metrics_local, "metrics", None)
+
+# 在当前线程绑定任务指标，翻译、ffmpeg等函数通过 record_metric 记录到该任务
+@contextmanager
+def bind_metrics(metrics):
+    previous = current_metrics()
+    _metrics_local.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _metrics_local.metrics = previous
+
+# 包装提交到线程池的函数，使其在工作线程中沿用提交时绑定（或指定）的任务指标
+def with_current_metrics(fn, metrics=None):
+    metrics = metrics or current_metrics()
+    if metrics is None:
+        return fn
+
+    def wrapper(*args, **kwargs):
+        with bind_metrics(metrics):
+            return fn(*args, **kwargs)
+    return wrapper
+
+# 记录一条指标事件到当前线程绑定的任务；没有绑定时不做任何事
+def record_metric(kind, **fields):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.record(kind, **fields)
+
+# 记录API返回的 usage（prompt/completion tokens）
+def record_usage(model, usage):
+    if usage:
+        record_metric("usage", model=model, prompt_tokens=usage.get("prompt_tokens", 0),
+                      completion_tokens=usage.get("completion_tokens", 0))
+
+# 单个任务的运行指标：阶段耗时、翻译批次延迟、tokens、重试/回退次数、编码速度等。
+# 每条事件立即追加到该任务的JSON Lines文件，finish 时写入汇总行并更新Prometheus文本文件；
+# profile 为 cprofile/tracemalloc 时每个阶段单独分析（cProfile只统计阶段所在的线程）
+class JobMetrics:
+    def __init__(self, name, path=None, profile="off", prometheus_file=None):
+        self.name = name
+        self.path = path
+        self.profile = profile
+        self.prometheus_file = prometheus_file
+        self.lock = threading.Lock()
+        self.events = []
+        self.file = None
+
+    # 按配置为视频创建任务指标；关闭时只在内存中汇总（用于日志），不写文件
+    @classmethod
+    def for_video(cls, video_path, settings=None):
+        settings = settings or load_metrics_settings()
+        name = os.path.basename(video_path)
+        if not settings["enabled"]:
+            return cls(name)
+        os.makedirs(settings["metrics_dir"], exist_ok=True)
+        path = os.path.join(settings["metrics_dir"],
+                            f"{os.path.splitext(name)[0]}_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        return cls(name, path, settings["profile"], settings["prometheus_file"])
+
+    def record(self, kind, **fields):
+        event = {"ts": round(time.time(), 3), "job": self.name, "type": kind, **fields}
+        with self.lock:
+            self.events.append(event)
+            if self.path is not None:
+                if self.file is None:
+                    self.file = open(self.path, "a", encoding="utf-8")
+                self.file.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self.file.flush()
+
+    # 记录一个阶段的起止和耗时；span 字典中的字段随阶段事件一起写出
+    @contextmanager
+    def span(self, stage, **fields):
+        span = dict(fields)
+        profiler = None
+        started_tracing = False
+        if self.profile == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 批量队列中其他阶段正在分析（同一时间只能有一个分析器）
+                profiler = None
+                span["profile"] = "skipped: another profiler is active"
+        elif self.profile == "tracemalloc":
+            import tracemalloc
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        started = time.monotonic()
+        try:
+            yield span
+        except BaseException as e:
+            span["error"] = str(e)
+            raise
+        finally:
+            span["seconds"] = round(time.monotonic() - started, 3)
+            if profiler is not None:
+                profiler.disable()
+                span["profile"] = self._dump_profile(stage, profiler)
+            elif self.profile == "tracemalloc":
+                span["tracemalloc"] = self._tracemalloc_report(started_tracing)
+            self.record("span", stage=stage, **span)
+
+    def _dump_profile(self, stage, profiler):
+        import pstats
+        import io
+        if self.path is not None:
+            prof_path = f"{os.path.splitext(self.path)[0]}_{stage}.prof"
+            profiler.dump_stats(prof_path)
+        else:
+            prof_path = None
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+        return {"path": prof_path, "top": out.getvalue().strip().splitlines()[-20:]}
+
+    @staticmethod
+    def _tracemalloc_report(stop):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return None  # 并发的阶段已结束跟踪
+        current, peak = tracemalloc.get_traced_memory()
+        top = [str(stat) for stat in tracemalloc.take_snapshot().statistics("lineno")[:10]]
+        if stop:
+            tracemalloc.stop()
+        return {"current_mb": round(current / 2**20, 2), "peak_mb": round(peak / 2**20, 2), "top": top}
+
+    # 从事件计算汇总：各阶段耗时、转写实时率、翻译批次/延迟/tokens/重试、编码fps
+    def summary(self):
+        with self.lock:
+            events = list(self.events)
+        stages = {}
+        for e in events:
+            if e["type"] == "span":
+                stages[e["stage"]] = round(stages.get(e["stage"], 0.0) + e["seconds"], 3)
+        latencies = sorted(e["seconds"] for e in events if e["type"] == "batch")
+        usage = [e for e in events if e["type"] == "usage"]
+        encodes = [e for e in events if e["type"] == "ffmpeg" and e.get("fps")]
+        summary = {
+            "stages": stages,
+            "translation": {
+                "batches": len(latencies),
+                "batch_seconds_avg": round(sum(latencies) / len(latencies), 3) if latencies else None,
+                "batch_seconds_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+                "retries": sum(1 for e in events if e["type"] == "retry"),
+                "rate_limited": sum(1 for e in events if e["type"] == "rate_limited"),
+                "repairs": sum(1 for e in events if e["type"] == "repair"),
+                "fallback_lines": sum(1 for e in events if e["type"] == "fallback"),
+                "prompt_tokens": sum(e["prompt_tokens"] for e in usage),
+                "completion_tokens": sum(e["completion_tokens"] for e in usage),
+            },
+            "encode": {
+                "runs": len(encodes),
+                "fps_avg": round(sum(e["fps"] for e in encodes) / len(encodes), 1) if encodes else None,
+            },
+        }
+        transcriptions = [e for e in events if e["type"] == "transcription" and e["audio_seconds"] > 0]
+        if transcriptions:
+            audio = sum(e["audio_seconds"] for e in transcriptions)
+            summary["transcription"] = {"audio_seconds": round(audio, 1),
+                                        "rtf": round(sum(e["seconds"] for e in transcriptions) / audio, 3)}
+        return summary
+
+    def format_summary(self, summary=None):
+        summary = summary or self.summary()
+        parts = [f"{stage} {seconds:.1f}s" for stage, seconds in summary["stages"].items()]
+        if "transcription" in summary:
+            parts.append(f"RTF {summary['transcription']['rtf']:.3f}")
+        t = summary["translation"]
+        if t["batches"]:
+            parts.append(f"{t['batches']} 批/平均 {t['batch_seconds_avg']:.1f}s/P95 {t['batch_seconds_p95']:.1f}s, "
+                         f"tokens {t['prompt_tokens']}+{t['completion_tokens']}, "
+                         f"重试 {t['retries']}, 逐行回退 {t['fallback_lines']}")
+        if summary["encode"]["fps_avg"]:
+            parts.append(f"编码 {summary['encode']['fps_avg']:.1f} fps")
+        return "运行指标: " + "; ".join(parts)
+
+    # 任务结束：写入汇总行，关闭文件并更新Prometheus文本文件，返回汇总
+    def finish(self, status):
+        summary = self.summary()
+        self.record("summary", status=status, **summary)
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        if self.prometheus_file:
+            write_prometheus_metrics(self.prometheus_file, self.name, status, summary)
+        return summary
+
+_prometheus_jobs = {}
+_prometheus_lock = threading.Lock()
+
+# 以Prometheus文本格式写出本进程内各任务最近一次的汇总（供node_exporter的textfile收集器读取）
+def write_prometheus_metrics(path, job_name, status, summary):
+    def label(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+    with _prometheus_lock:
+        _prometheus_jobs[job_name] = (status, summary)
+        metrics = {}  # 指标名 -> (类型, 说明, [(标签, 值)])
+
+        def add(name, kind, help_text, labels, value):
+            if value is not None:
+                metrics.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+
+        for job, (job_status, s) in _prometheus_jobs.items():
+            job_label = f'job="{label(job)}"'
+            add("setm_job_success", "gauge", "1 if the last run of the job succeeded", job_label,
+                1 if job_status == "done" else 0)
+            for stage, seconds in s["stages"].items():
+                add("setm_stage_seconds", "gauge", "Wall time per pipeline stage", f'{job_label},stage="{label(stage)}"',
+                    seconds)
+            if "transcription" in s:
+                add("setm_transcription_rtf", "gauge", "Transcription real-time factor", job_label,
+                    s["transcription"]["rtf"])
+            t = s["translation"]
+            add("setm_translation_batches_total", "counter", "Translation batches", job_label, t["batches"])
+            add("setm_translation_batch_seconds_avg", "gauge", "Mean translation batch latency", job_label,
+                t["batch_seconds_avg"])
+            add("setm_translation_batch_seconds_p95", "gauge", "95th percentile translation batch latency", job_label,
+                t["batch_seconds_p95"])
+            for kind in ("prompt", "completion"):
+                add("setm_translation_tokens_total", "counter", "API tokens from the usage field",
+                    f'{job_label},kind="{kind}"', t[f"{kind}_tokens"])
+            for key in ("retries", "rate_limited", "repairs", "fallback_lines"):
+                add(f"setm_translation_{key}_total", "counter", f"Translation {key.replace('_', ' ')}", job_label, t[key])
+            add("setm_encoder_fps", "gauge", "Mean ffmpeg encoder fps", job_label, s["encode"]["fps_avg"])
+
+        lines = []
+        for name, (kind, help_text, samples) in metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines += [f"{name}{{{labels}}} {value}" for labels, value in samples]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+# ---------------- 子进程监管 ----------------
+
+# 子进程监管：stdout、stderr 各由一个线程同时读取，任何一个管道都不会因写满而让子进程阻塞。
+# 每行输出先交给 on_stdout/on_stderr 回调，再存入有界的环形缓冲，出错时用于输出最后若干行
+class SupervisedProcess:
+    TAIL_LINES = 200  # 每个管道保留的最后行数
+
+    def __init__(self, cmd, on_stdout=None, on_stderr=None, env=None, tail_lines=TAIL_LINES):
+        self.cmd = cmd
+        self.stdout_tail = deque(maxlen=tail_lines)
+        self.stderr_tail = deque(maxlen=tail_lines)
+        self.process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        universal_newlines=True, encoding='utf-8', errors='replace', env=env)
+        self.readers = [
+            threading.Thread(target=self._drain, args=(self.process.stdout, self.stdout_tail, on_stdout), daemon=True),
+            threading.Thread(target=self._drain, args=(self.process.stderr, self.stderr_tail, on_stderr), daemon=True),
+        ]
+        for reader in self.readers:
+            reader.start()
+
+    @staticmethod
+    def _drain(stream, tail, callback):
+        with stream:
+            for line in stream:
+                line = line.rstrip("\r\n")
+                tail.append(line)
+                if callback is not None:
+                    callback(line)
+
+    @property
+    def returncode(self):
+        return self.process.returncode
+
+    def poll(self):
+        return self.process.poll()
+
+    # 等待进程结束并读完两个管道，返回退出码；cancel_check 返回True时结束进程并返回None
+    def wait(self, cancel_check=None, interval=0.2):
+        while self.process.poll() is None:
+            if cancel_check is not None and cancel_check():
+                self.kill()
+                return None
+            time.sleep(interval)
+        for reader in self.readers:
+            reader.join()
+        return self.process.returncode
+
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        for reader in self.readers:
+            reader.join(timeout=5)
+
+    def stderr_text(self):
+        return "\n".join(self.stderr_tail)
+
+# 统一的进度/剩余时间计算：按已处理的媒体秒数和处理速度（媒体秒/实际秒）估算，
+# 每次更新调用 callback(百分比, 剩余秒数)，剩余时间无法估算时为None
+class ProgressTracker:
+    def __init__(self, total_seconds, callback=None):
+        self.total_seconds = total_seconds or 0.0
+        self.callback = callback
+        self.started = time.monotonic()
+        self.done_seconds = 0.0
+        self.speed = None
+
+    def update(self, done_seconds, speed=None):
+        self.done_seconds = max(0.0, done_seconds)
+        if self.total_seconds:
+            self.done_seconds = min(self.done_seconds, self.total_seconds)
+        self.speed = speed or None
+        if self.callback is not None:
+            self.callback(self.percent, self.eta)
+
+    @property
+    def percent(self):
+        return int(self.done_seconds / self.total_seconds * 100) if self.total_seconds else 0
+
+    @property
+    def eta(self):
+        remaining = self.total_seconds - self.done_seconds
+        if remaining <= 0:
+            return 0.0
+        speed = self.speed
+        if not speed:
+            elapsed = time.monotonic() - self.started
+            speed = self.done_seconds / elapsed if self.done_seconds > 0 and elapsed > 0 else None
+        return remaining / speed if speed else None
+
+# 格式化剩余时间，例如 "01:05:09"，未知时为 "--:--"
+def format_eta(eta):
+    if eta is None:
+        return "--:--"
+    minutes, seconds = divmod(int(eta), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+# 解析ffmpeg -progress 输出的 key=value 块（每块以 progress=continue/end 结束），
+# 每块回调一次 on_block(self)，可读取 out_time（秒）、speed、fps、finished
+class FFmpegProgress:
+    def __init__(self, on_block=None):
+        self.on_block = on_block
+        self.out_time = 0.0
+        self.speed = None
+        self.fps = None
+        self.finished = False
+        self._block = {}
+
+    def feed(self, line):
+        key, sep, value = line.partition("=")
+        if not sep:
+            return
+        if key != "progress":
+            self._block[key] = value.strip()
+            return
+        block, self._block = self._block, {}
+        # out_time_us 是微秒；旧版本ffmpeg的 out_time_ms 实际上也是微秒
+        out_time = block.get("out_time_us") or block.get("out_time_ms")
+        if out_time and out_time != "N/A":
+            self.out_time = max(self.out_time, int(out_time) / 1e6)
+        speed = block.get("speed", "N/A").rstrip("x")
+        if speed not in ("N/A", ""):
+            self.speed = float(speed)
+        if block.get("fps") not in (None, "N/A"):
+            self.fps = float(block["fps"])
+        self.finished = value.strip() == "end"
+        if self.on_block is not None:
+            self.on_block(self)
+
+# 在ffmpeg命令中加入机器可读的进度输出（stdout）并关闭stderr中的统计行
+def ffmpeg_with_progress(cmd):
+    return [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+
+# 运行一条ffmpeg命令：进度按 -progress 输出计算，stderr 逐行写入日志；
+# progress_callback(百分比, 剩余秒数)；用户中止时返回False，失败时输出stderr末尾并抛出RuntimeError
+def run_ffmpeg_command(cmd, total_duration, log_signal, progress_callback=None, cancel_check=None,
+                       error_message="字幕合成失败，请查看日志获取详细错误信息。"):
+    tracker = ProgressTracker(total_duration, progress_callback)
+    started = time.monotonic()
+    progress = FFmpegProgress(lambda p: tracker.update(p.out_time, p.speed))
+    process = SupervisedProcess(ffmpeg_with_progress(cmd), on_stdout=progress.feed,
+                                on_stderr=log_signal.emit)
+    returncode = process.wait(cancel_check)
+    if returncode is None:
+        return False
+    if returncode != 0:
+        log_signal.emit("[ERROR] FFmpeg Stderr Output:\n" + process.stderr_text())
+        raise RuntimeError(error_message)
+    tracker.update(tracker.total_seconds)
+    record_metric("ffmpeg", media_seconds=round(progress.out_time, 3), seconds=round(time.monotonic() - started, 3),
+                  speed=progress.speed, fps=progress.fps)
+    if progress.speed:
+        log_signal.emit(f"[INFO] ffmpeg 完成：速度 {progress.speed:.2f}x" +
+                        (f"，{progress.fps:.1f} fps" if progress.fps else ""))
+    return True
+
+# ---------------- 音频预提取 ----------------
+
+# 读取缓存目录，默认为用户目录下的 .setm_cache
+def get_cache_dir(*parts):
+    config = load_config()
+    base = os.path.expanduser(config.get('Cache', 'cache_dir', fallback=os.path.join('~', '.setm_cache')))
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# 源文件指纹：绝对路径+大小+修改时间，文件变化后缓存自动失效
+def source_fingerprint(path):
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+# 内容指纹：文件大小 + 头/中/尾各1MB的哈希，大文件也只读取少量数据，与路径和修改时间无关
+def content_fingerprint(path, sample_size=1 << 20):
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode("utf-8"))
+    with open(path, "rb") as f:
+        if size <= sample_size * 3:
+            digest.update(f.read())
+        else:
+            for offset in (0, size // 2, size - sample_size):
+                f.seek(offset)
+                digest.update(f.read(sample_size))
+    return digest.hexdigest()[:24]
+
+# 内容寻址的产物缓存：每个阶段的输出（音频、原文SRT、译文SRT、成品视频）以
+# 输入指纹+阶段参数为键保存，输入不变时直接复用；总大小超出上限时按最近使用时间淘汰。
+# 成品视频体积大，不复制进缓存，只记录输出文件的位置和内容指纹
+class ArtifactCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "artifacts.db"), check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS artifacts_last_used ON artifacts(last_used)")
+        # 缓存之外由本工具写出的文件（视频旁的原文SRT）及写出时的内容指纹，用于区分用户提供或手动修改过的文件
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS outputs (
+                path TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(stage, parts):
+        raw = json.dumps([stage, parts], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, stage, parts):
+        """返回缓存中的产物路径，未命中时返回None"""
+        key = self.make_key(stage, parts)
+        with self.lock:
+            row = self.conn.execute("SELECT path FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if row and not self._is_valid(row[0]):
+                self.conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+                row = None
+            if row:
+                self.conn.execute("UPDATE artifacts SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.conn.commit()
+        return row[0] if row else None
+
+    def put(self, stage, parts, source_path, move=False, ext=None, reference=False):
+        """
+        保存产物（move=True 时直接移入缓存），返回缓存中的路径。
+        reference=True 时不复制文件，只记录原文件的位置和内容指纹（成品视频），
+        原文件被删除或修改后视为未命中；这类记录不占缓存容量，淘汰时也不会删除原文件
+        """
+        key = self.make_key(stage, parts)
+        if reference:
+            path = os.path.abspath(source_path)
+            self.mark_output(path)
+            size = 0
+        else:
+            directory = os.path.join(self.root, stage, key[:2])
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, key + (ext or os.path.splitext(source_path)[1]))
+            if move:
+                os.replace(source_path, path)
+            else:
+                shutil.copyfile(source_path, path + ".part")
+                os.replace(path + ".part", path)
+            size = os.path.getsize(path)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                (key, stage, path, size, time.time())
+            )
+            self._evict(keep=key)
+            self.conn.commit()
+        return path
+
+    def restore(self, stage, parts, dest_path):
+        """命中时把产物复制到 dest_path 并返回True"""
+        path = self.get(stage, parts)
+        if path is None:
+            return False
+        if os.path.abspath(path) == os.path.abspath(dest_path):
+            return True
+        shutil.copyfile(path, dest_path + ".part")
+        os.replace(dest_path + ".part", dest_path)
+        return True
+
+    def mark_output(self, path):
+        """记录本工具写出的文件及其内容指纹"""
+        fingerprint = content_fingerprint(path)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?)", (os.path.abspath(path), fingerprint))
+            self.conn.commit()
+
+    def is_own_output(self, path):
+        """path 是本工具写出且之后未被修改的文件时返回True"""
+        with self.lock:
+            return self._is_own_output(path)
+
+    def _is_own_output(self, path):
+        row = self.conn.execute(
+            "SELECT fingerprint FROM outputs WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+        return row is not None and row[0] == content_fingerprint(path)
+
+    # 缓存目录之外的路径是 reference=True 记录的原文件
+    def _is_reference(self, path):
+        return not os.path.abspath(path).startswith(os.path.join(os.path.abspath(self.root), ""))
+
+    def _is_valid(self, path):
+        if not os.path.exists(path):
+            return False
+        return not self._is_reference(path) or self._is_own_output(path)
+
+    def _evict(self, keep):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute(
+            "SELECT key, path, size FROM artifacts WHERE key != ? AND size > 0 ORDER BY last_used ASC", (keep,)
+        ).fetchall()
+        for key, path, size in rows:
+            if total <= self.max_bytes:
+                break
+            if not self._is_reference(path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self):
+        return f"Artifact cache: {self.hits} hits, {self.misses} misses"
+
+_artifact_cache = None
+_artifact_cache_lock = threading.Lock()
+
+# 获取进程内共享的产物缓存
+def get_artifact_cache():
+    global _artifact_cache
+    with _artifact_cache_lock:
+        if _artifact_cache is None:
+            config = load_config()
+            max_mb = config.getint('Cache', 'max_size_mb', fallback=20480)
+            _artifact_cache = ArtifactCache(get_cache_dir("artifacts"), max_mb * 1024 * 1024)
+    return _artifact_cache
+
+# 提取16kHz单声道PCM音频（WAV），同一内容的源文件只解码一次；用户中止时返回None
+def extract_audio(video_path, log_signal, cancel_check=None):
+    cache = get_artifact_cache()
+    cache_parts = audio_cache_parts(video_path)
+    audio_path = cache.get("audio", cache_parts)
+    if audio_path is not None:
+        log_signal.emit(f"[INFO] 使用已缓存的音频: {audio_path}")
+        return audio_path
+    tmp_path = os.path.join(cache.root, f"{source_fingerprint(video_path)}.wav.part")
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", video_path,
+        "-vn", "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le", "-f", "wav", tmp_path
+    ]
+    log_signal.emit(f"[DEBUG] {cmd}")
+    if not run_ffmpeg_command(cmd, None, log_signal, cancel_check=cancel_check, error_message="音频提取失败"):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    audio_path = cache.put("audio", cache_parts, tmp_path, move=True, ext=".wav")
+    log_signal.emit(f"[INFO] 音频已提取: {audio_path}")
+    return audio_path
+
+def audio_cache_parts(video_path):
+    return [content_fingerprint(video_path), 16000, 1]
+
+# 只提取 [start, start+duration) 的音频写入 output_path（预览用）：整段音频已缓存时直接截取，
+# 否则用输入端 -ss/-t 只解码这一段，长视频的预览不必先提取整段音频；用户中止时返回None
+def extract_audio_window(video_path, start, duration, output_path, log_signal, cancel_check=None):
+    audio_path = get_artifact_cache().get("audio", audio_cache_parts(video_path))
+    if audio_path is not None:
+        return write_wav_window(audio_path, start, duration, output_path)
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-ss", f"{start:.3f}", "-t", f"{duration:.3f}",
+        "-i", video_path, "-vn", "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le", "-f", "wav", output_path
+    ]
+    log_signal.emit(f"[DEBUG] {cmd}")
+    if not run_ffmpeg_command(cmd, duration, log_signal, cancel_check=cancel_check, error_message="音频提取失败"):
+        return None
+    return output_path
+
+# 解析16位PCM WAV的头部，返回 (data块的字节偏移, 采样点数)；跳过LIST、fact等其他块
+def read_wav_data_range(path):
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError(f"不是WAV文件: {path}")
+        offset = 12
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError(f"WAV文件缺少data块: {path}")
+            chunk_id, chunk_size = chunk[:4], int.from_bytes(chunk[4:], "little")
+            offset += 8
+            if chunk_id == b"data":
+                break
+            f.seek(chunk_size + (chunk_size & 1), 1)
+            offset += chunk_size + (chunk_size & 1)
+    file_samples = (os.path.getsize(path) - offset) // 2
+    # ffmpeg 写管道/超大文件时data块长度可能为0或无效，以文件实际长度为准
+    count = chunk_size // 2 if 0 < chunk_size // 2 <= file_samples else file_samples
+    return offset, count
+
+# 预提取的16kHz单声道16位PCM WAV的时长（秒）
+def wav_duration(path):
+    return read_wav_data_range(path)[1] / 16000
+
+# 以内存映射方式读取16位PCM WAV，返回whisper所需的float32采样；
+# 指定 start/end（采样点）时先截取int16内存映射，只转换该区间，分块转写不必把整个文件转成float32
+def load_wav_samples(path, start=None, end=None):
+    import numpy as np
+    offset, count = read_wav_data_range(path)
+    pcm = np.memmap(path, dtype=np.int16, mode="r", offset=offset, shape=(count,))[start:end]
+    return pcm.astype(np.float32) / 32768.0
+
+# 截取WAV音频中 [start, start+duration) 的片段写入 output_path，供预览只转写所选时间段
+def write_wav_window(audio_path, start, duration, output_path):
+    with wave.open(audio_path, "rb") as src:
+        rate = src.getframerate()
+        src.setpos(min(src.getnframes(), int(start * rate)))
+        frames = src.readframes(int(duration * rate))
+        params = src.getparams()
+    with wave.open(output_path, "wb") as dst:
+        dst.setparams(params)
+        dst.writeframes(frames)
+    return output_path
+
+# ---------------- Whisper常驻工作进程 ----------------
+
+# 与 whisper 命令行默认值一致的解码参数，保证时间轴和SRT输出相同
+WHISPER_CLI_DECODE_OPTIONS = {
+    "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+    "best_of": 5,
+    "beam_size": 5,
+}
+
+# 各模型加载后的大致内存占用（MB），用于内存上限下的淘汰
+WHISPER_MODEL_MEMORY_MB = {
+    "tiny": 150, "base": 300, "small": 1000, "medium": 3000, "large": 6000,
+}
+
+# 读取Whisper相关配置
+def load_whisper_settings():
+    config = load_config()
+    return {
+        "use_worker": config.getboolean('Whisper', 'use_worker', fallback=True),
+        "max_models": config.getint('Whisper', 'max_models', fallback=2),
+        "memory_cap_mb": config.getint('Whisper', 'memory_cap_mb', fallback=8000),
+        "parallel": config.getboolean('Whisper', 'parallel', fallback=False),
+        "pool_size": config.getint('Whisper', 'pool_size', fallback=0),
+        "max_chunk_sec": config.getint('Whisper', 'max_chunk_sec', fallback=300),
+        "engine": config.get('Whisper', 'engine', fallback=WhisperEngine.name),
+    }
+
+# ---------------- 转写引擎 ----------------
+
+# 与whisper verbose输出一致的时间戳格式（不足一小时省略小时）
+def format_verbose_timestamp(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    prefix = f"{hours:02d}:" if hours else ""
+    return f"{prefix}{minutes:02d}:{secs:02d}.{milliseconds:03d}"
+
+# 转写引擎接口：加载模型，并把16kHz单声道采样转写为 [(开始秒, 结束秒, 文本), ...]
+# verbose时每得到一个片段按whisper的格式打印一行，供日志和下游解析
+class TranscriptionEngine:
+    name = ""
+    memory_factor = 1.0  # 相对float32模型的内存占用比例
+
+    def load_model(self, model_size):
+        raise NotImplementedError
+
+    def transcribe(self, model, audio, language, verbose=True):
+        raise NotImplementedError
+
+# openai-whisper（float32），解码参数与命令行默认值一致
+class WhisperEngine(TranscriptionEngine):
+    name = "whisper"
+
+    def load_model(self, model_size):
+        import whisper
+        return whisper.load_model(model_size)
+
+    def transcribe(self, model, audio, language, verbose=True):
+        result = model.transcribe(audio, language=language, verbose=True if verbose else None,
+                                  **WHISPER_CLI_DECODE_OPTIONS)
+        return [(seg["start"], seg["end"], seg["text"]) for seg in result["segments"]]
+
+# faster-whisper（CTranslate2），CPU上默认使用int8量化
+class FasterWhisperEngine(TranscriptionEngine):
+    name = "faster-whisper"
+    memory_factor = 0.3
+    MODEL_NAMES = {"large": "large-v3"}
+
+    def __init__(self, compute_type="int8", device="cpu"):
+        self.compute_type = compute_type
+        self.device = device
+
+    def load_model(self, model_size):
+        from faster_whisper import WhisperModel
+        return WhisperModel(self.MODEL_NAMES.get(model_size, model_size), device=self.device,
+                            compute_type=self.compute_type)
+
+    def transcribe(self, model, audio, language, verbose=True):
+        segments, _ = model.transcribe(audio, language=language, **WHISPER_CLI_DECODE_OPTIONS)
+        results = []
+        for seg in segments:  # 生成器，边解码边产出片段
+            results.append((seg.start, seg.end, seg.text))
+            if verbose:
+                print(f"[{format_verbose_timestamp(seg.start)} --> {format_verbose_timestamp(seg.end)}] {seg.text}")
+        return results
+
+TRANSCRIPTION_ENGINES = {
+    WhisperEngine.name: WhisperEngine,
+    FasterWhisperEngine.name: FasterWhisperEngine,
+}
+
+# 按名称创建转写引擎
+def create_transcription_engine(name):
+    if name not in TRANSCRIPTION_ENGINES:
+        raise ValueError(f"未知的转写引擎: {name}")
+    if name == FasterWhisperEngine.name:
+        config = load_config()
+        return FasterWhisperEngine(config.get('Whisper', 'compute_type', fallback='int8'))
+    return TRANSCRIPTION_ENGINES[name]()
+
+# 转写实时率日志
+def format_rtf(engine_name, audio_seconds, elapsed):
+    return (f"[INFO] {engine_name} 转写耗时 {elapsed:.1f}s, 音频 {audio_seconds:.0f}s, "
+            f"RTF {elapsed / max(audio_seconds, 1e-6):.3f}")
+
+# 把工作进程中的print输出按行转发给主进程
+class _PipeLineWriter:
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            self.conn.send(("log", line))
+        return len(text)
+
+    def flush(self):
+        pass
+
+# 工作进程入口：按(引擎, model_size)缓存已加载的模型，按最近使用淘汰
+def whisper_worker_main(conn, max_models, memory_cap_mb):
+    import traceback
+    from collections import OrderedDict
+
+    models = OrderedDict()
+    engines = {}
+
+    def model_memory(key):
+        engine_name, model_size = key
+        return WHISPER_MODEL_MEMORY_MB.get(model_size, 1000) * TRANSCRIPTION_ENGINES[engine_name].memory_factor
+
+    def get_model(engine, model_size):
+        key = (engine.name, model_size)
+        if key in models:
+            models.move_to_end(key)
+            return models[key]
+        while models and (len(models) >= max_models or
+                          sum(model_memory(k) for k in models) + model_memory(key) > memory_cap_mb):
+            evicted, _ = models.popitem(last=False)
+            conn.send(("log", f"[INFO] Whisper worker evicted model: {evicted[0]}/{evicted[1]}"))
+        conn.send(("log", f"[INFO] Whisper worker loading model: {engine.name}/{model_size}"))
+        models[key] = engine.load_model(model_size)
+        return models[key]
+
+    sys.stdout = _PipeLineWriter(conn)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == "shutdown":
+            break
+        job = message[1]
+        try:
+            if job["engine"] not in engines:
+                engines[job["engine"]] = create_transcription_engine(job["engine"])
+            engine = engines[job["engine"]]
+            model = get_model(engine, job["model_size"])
+            audio = job["audio"]
+            if audio.endswith(".wav"):
+                audio = load_wav_samples(audio)  # 预提取的PCM直接内存映射，不再经ffmpeg解码
+            started = time.monotonic()
+            segments = engine.transcribe(model, audio, job["language"], verbose=True)
+            elapsed = time.monotonic() - started
+            if not isinstance(audio, str):
+                print(format_rtf(engine.name, len(audio) / 16000, elapsed))
+            # 两种引擎统一用write_srt输出，格式与whisper命令行一致
+            name = os.path.splitext(os.path.basename(job["name"]))[0]
+            write_srt(segments, os.path.join(job["output_dir"], name + ".srt"))
+            sys.stdout.flush()
+            conn.send(("done", None))
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+
+# 主进程侧的工作进程句柄：同一时间只处理一个任务，排队的任务复用已加载的模型
+class WhisperWorker:
+    def __init__(self, max_models=2, memory_cap_mb=8000):
+        self.max_models = max_models
+        self.memory_cap_mb = memory_cap_mb
+        self.process = None
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        import multiprocessing
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=whisper_worker_main, args=(child_conn, self.max_models, self.memory_cap_mb), daemon=True
+        )
+        self.process.start()
+
+    def transcribe(self, audio, model_size, language, output_dir, log_signal, cancel_check=None, name=None,
+                   engine=WhisperEngine.name, on_segment=None, progress_callback=None):
+        """
+        Transcribes audio into <output_dir>/<name>.srt (name defaults to the
+        audio file), the same file the whisper CLI writes. Returns False if cancel_check() asked to stop, in
+        which case the worker is killed and restarted on the next job.
+        progress_callback(percent, eta) follows the end time of each relayed
+        segment line, as for the whisper CLI.
+        """
+        tracker = ProgressTracker(wav_duration(audio) if audio.endswith(".wav") else None, progress_callback)
+        with self.lock:
+            self._ensure_started()
+            self.conn.send(("transcribe", {
+                "audio": audio, "model_size": model_size, "language": language, "output_dir": output_dir,
+                "name": name or audio, "engine": engine
+            }))
+            while True:
+                if cancel_check is not None and cancel_check():
+                    self.terminate()
+                    return False
+                if not self.conn.poll(0.2):
+                    if not self.process.is_alive():
+                        self.process = None
+                        raise RuntimeError("Whisper工作进程意外退出")
+                    continue
+                kind, payload = self.conn.recv()
+                if kind == "log":
+                    log_signal.emit(payload.strip())
+                    match = WHISPER_SEGMENT_PATTERN.match(payload.strip())
+                    if match is not None:
+                        tracker.update(parse_whisper_timestamp(match.group(2)))
+                        if on_segment is not None:
+                            on_segment(match.group(3))
+                elif kind == "done":
+                    tracker.update(tracker.total_seconds)
+                    return True
+                elif kind == "error":
+                    log_signal.emit(payload)
+                    raise RuntimeError("字幕提取失败")
+
+    def terminate(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(5)
+        self.process = None
+        self.conn = None
+
+    def shutdown(self):
+        if self.process is not None and self.process.is_alive():
+            try:
+                self.conn.send(("shutdown",))
+                self.process.join(5)
+            except (OSError, EOFError):
+                pass
+        self.terminate()
+
+_whisper_worker = None
+_whisper_worker_lock = threading.Lock()
+
+# 获取进程内共享的Whisper工作进程
+def get_whisper_worker():
+    global _whisper_worker
+    with _whisper_worker_lock:
+        if _whisper_worker is None:
+            settings = load_whisper_settings()
+            _whisper_worker = WhisperWorker(settings["max_models"], settings["memory_cap_mb"])
+        return _whisper_worker
+
+def shutdown_whisper_worker():
+    with _whisper_worker_lock:
+        if _whisper_worker is not None:
+            _whisper_worker.shutdown()
+
+# ---------------- 并行分块转写 ----------------
+
+# 在静音处切分音频，返回 [(音频起点, 音频终点, 保留起点, 保留终点), ...]（单位：采样点）
+# 找不到静音时强制切分，并让相邻分块重叠 overlap_sec，拼接时按片段中点归属去重
+def plan_audio_chunks(samples, sample_rate, max_chunk_sec, min_silence_sec=0.3, overlap_sec=2.0):
+    import numpy as np
+    total = len(samples)
+    max_chunk = int(max_chunk_sec * sample_rate)
+    if total <= max_chunk:
+        return [(0, total, 0, total)]
+
+    # 30ms一帧计算能量，低于阈值的连续帧视为静音
+    frame = int(0.03 * sample_rate)
+    frame_count = total // frame
+    rms = np.sqrt(np.mean(np.square(samples[:frame_count * frame].reshape(frame_count, frame)), axis=1))
+    # 阈值取本底噪声的1.5倍（不低于-45dBFS），但不超过能量中位数的一半
+    threshold = min(max(10 ** (-45 / 20), float(np.percentile(rms, 10)) * 1.5), float(np.median(rms)) * 0.5)
+    silent = rms < threshold
+    min_frames = max(1, int(min_silence_sec / 0.03))
+    silence_mids = []  # 每段足够长的静音的中点（采样点）
+    run_start = None
+    for i, is_silent in enumerate(np.append(silent, False)):
+        if is_silent and run_start is None:
+            run_start = i
+        elif not is_silent and run_start is not None:
+            if i - run_start >= min_frames:
+                silence_mids.append((run_start + i) // 2 * frame)
+            run_start = None
+
+    cuts = []  # [(切分点, 是否强制切分)]
+    position = 0
+    while total - position > max_chunk:
+        # 取 [position + max/2, position + max] 区间内最靠后的静音
+        candidates = [m for m in silence_mids if position + max_chunk // 2 <= m <= position + max_chunk]
+        if candidates:
+            cuts.append((candidates[-1], False))
+        else:
+            cuts.append((position + max_chunk, True))
+        position = cuts[-1][0]
+
+    overlap = int(overlap_sec * sample_rate)
+    boundaries = [(0, False)] + cuts + [(total, False)]
+    chunks = []
+    for (keep_start, forced_start), (keep_end, forced_end) in zip(boundaries, boundaries[1:]):
+        audio_start = max(0, keep_start - overlap) if forced_start else keep_start
+        audio_end = min(total, keep_end + overlap) if forced_end else keep_end
+        chunks.append((audio_start, audio_end, keep_start, keep_end))
+    return chunks
+
+_chunk_model = None
+
+_chunk_engine = None
+
+# 分块转写进程的初始化：每个进程加载一次模型，并限制计算线程数避免超额订阅
+def _chunk_worker_init(engine_name, model_size, threads):
+    global _chunk_model, _chunk_engine
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    if engine_name == WhisperEngine.name:
+        import torch
+        torch.set_num_threads(threads)
+    _chunk_engine = create_transcription_engine(engine_name)
+    _chunk_model = _chunk_engine.load_model(model_size)
+
+# 转写一个分块，返回 (分块序号, [(开始秒, 结束秒, 文本)], 耗时秒数)，时间为相对分块起点
+def _transcribe_chunk(index, audio_path, audio_start, audio_end, language):
+    started = time.monotonic()
+    samples = load_wav_samples(audio_path, audio_start, audio_end)
+    segments = _chunk_engine.transcribe(_chunk_model, samples, language, verbose=False)
+    return index, segments, time.monotonic() - started
+
+# 并行分块转写：静音处切分，多进程转写后拼接为一个SRT；用户中止时返回False
+def transcribe_parallel(audio_path, srt_path, model_size, language, log_signal, cancel_check=None,
+                        pool_size=0, max_chunk_sec=300, engine=WhisperEngine.name, on_segment=None,
+                        progress_callback=None):
+    import multiprocessing
+    sample_rate = 16000
+    samples = load_wav_samples(audio_path)
+    duration = len(samples) / sample_rate
+    chunks = plan_audio_chunks(samples, sample_rate, max_chunk_sec)
+    del samples
+    cpu_count = os.cpu_count() or 1
+    pool_size = min(len(chunks), pool_size if pool_size > 0 else max(1, cpu_count // 4))
+    threads = max(1, cpu_count // pool_size)
+    log_signal.emit(f"[INFO] 并行转写: {len(chunks)} 个分块, {pool_size} 个进程, 每进程 {threads} 线程")
+
+    started = time.monotonic()
+    chunk_results = {}
+    # 进度按已完成分块的保留区间累计
+    tracker = ProgressTracker(duration, progress_callback)
+    pool = multiprocessing.get_context("spawn").Pool(pool_size, _chunk_worker_init, (engine, model_size, threads))
+    try:
+        pending = [
+            pool.apply_async(_transcribe_chunk, (i, audio_path, audio_start, audio_end, language))
+            for i, (audio_start, audio_end, _, _) in enumerate(chunks)
+        ]
+        while pending:
+            if cancel_check is not None and cancel_check():
+                pool.terminate()
+                return False
+            for async_result in [r for r in pending if r.ready()]:
+                pending.remove(async_result)
+                index, segments, elapsed = async_result.get()
+                chunk_results[index] = (segments, elapsed)
+                _, _, keep_start, keep_end = chunks[index]
+                tracker.update(tracker.done_seconds + (keep_end - keep_start) / sample_rate)
+                if on_segment is not None:
+                    for _, _, text in segments:
+                        on_segment(text)
+                log_signal.emit(f"[INFO] 分块 {len(chunk_results)}/{len(chunks)} 完成 (#{index + 1}, {elapsed:.1f}s)")
+            time.sleep(0.2)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    # 拼接：加上分块偏移，只保留中点落在该分块保留区间内的片段，去掉重叠部分的重复
+    stitched = []
+    for index, (audio_start, _, keep_start, keep_end) in enumerate(chunks):
+        offset = audio_start / sample_rate
+        for start, end, text in chunk_results[index][0]:
+            start, end = start + offset, end + offset
+            midpoint = (start + end) / 2 * sample_rate
+            if keep_start <= midpoint < keep_end or (index == len(chunks) - 1 and midpoint >= keep_end):
+                stitched.append((start, end, text))
+    write_srt(stitched, srt_path)
+
+    wall = time.monotonic() - started
+    serial = sum(elapsed for _, elapsed in chunk_results.values())
+    log_signal.emit(format_rtf(engine, duration, wall))
+    log_signal.emit(f"[INFO] 并行转写: 分块累计 {serial:.1f}s, 相对单进程加速约 {serial / max(wall, 1e-6):.1f}x")
+    return True
+
+# ---------------- 边转写边翻译 ----------------
+
+# whisper verbose输出的片段行，例如 "[01:02.000 --> 01:05.500]  text"
+WHISPER_SEGMENT_PATTERN = re.compile(r'^\[((?:\d+:)?\d+:\d+\.\d+) --> ((?:\d+:)?\d+:\d+\.\d+)\]\s*(.*)$')
+
+# 解析whisper输出中的时间戳（[时:]分:秒.毫秒）为秒
+def parse_whisper_timestamp(value):
+    return sum(float(part) * 60 ** i for i, part in enumerate(reversed(value.split(":"))))
+
+# 边转写边翻译：接收Whisper逐段产出的文本，攒够一个token预算或等待过久就提交翻译
+# 结果以 {原文: 译文} 返回，供 translate_srt_file 作为已知译文，只补译对不上的条目
+class StreamingTranslator:
+    MAX_WAIT = 20  # 缓冲区中最早的片段最多等待的秒数
+
+    def __init__(self, api_key, log_signal, source_lang, translator=None, translation_memory=None,
+                 concurrency=None, target_lang=DEFAULT_TARGET_LANG):
+        self.log_signal = log_signal
+        self.source_lang = source_lang
+        self.translator = translator or create_translator(api_key, target_lang)
+        self.prompt_hash = translation_prompt_hash(self.translator.target_lang)
+        self.translation_memory = translation_memory if translation_memory is not None else get_translation_memory()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, concurrency or load_translation_settings()["concurrency"]))
+        self.skip_patterns = load_skip_patterns()
+        self.batcher = TokenBudgetBatcher()
+        self.lock = threading.Lock()
+        self.results = {}
+        self.seen = set()
+        self.buffer = []  # [(片段序号, 原文)]
+        self.buffer_since = None
+        self.futures = []
+        self.segment_count = 0
+        self.batch_num = 0
+        # 片段由转写输出的读取线程送入，提交批次时使用创建时所在任务的指标
+        self.metrics = current_metrics()
+
+    def add_segment(self, text):
+        text = text.replace('\n', ' ').strip()
+        self.segment_count += 1
+        if text in self.seen or needs_no_translation(text, self.skip_patterns):
+            return
+        self.seen.add(text)
+        if not self.buffer:
+            self.buffer_since = time.monotonic()
+        self.buffer.append((self.segment_count - 1, text))
+        texts = [t for _, t in self.buffer]
+        if self.batcher.take(texts) < len(texts):
+            self._submit(self.buffer[:-1])
+            self.buffer = self.buffer[-1:]
+            self.buffer_since = time.monotonic()
+        elif time.monotonic() - self.buffer_since > self.MAX_WAIT:
+            self._submit(self.buffer)
+            self.buffer = []
+
+    def _submit(self, items):
+        if not items:
+            return
+        texts = [text for _, text in items]
+        if self.translation_memory is not None:
+            cached = self.translation_memory.get_many(texts, self.source_lang, self.translator.model, self.prompt_hash)
+            with self.lock:
+                self.results.update(cached)
+            items = [(idx, text) for idx, text in items if text not in cached]
+            if not items:
+                return
+        self.batch_num += 1
+        future = self.executor.submit(
+            with_current_metrics(translate_batch, self.metrics), [text for _, text in items],
+            [idx for idx, _ in items], self.batch_num, self.translator, self.log_signal
+        )
+        future.add_done_callback(lambda f, texts=[text for _, text in items]: self._collect(texts, f))
+        self.futures.append(future)
+
+    def _collect(self, texts, future):
+        if future.cancelled() or future.exception() is not None:
+            return  # 交给 translate_srt_file 补译
+        translated, _, _ = future.result()
+        pairs = [(text, translation) for text, translation in zip(texts, translated) if translation is not None]
+        with self.lock:
+            self.results.update(pairs)
+        if self.translation_memory is not None:
+            self.translation_memory.put_many(pairs, self.source_lang, self.translator.model, self.prompt_hash)
+
+    def finish(self):
+        """提交剩余片段并等待所有批次完成，返回 {原文: 译文}"""
+        self._submit(self.buffer)
+        self.buffer = []
+        wait(self.futures)
+        self.executor.shutdown()
+        with self.lock:
+            self.log_signal.emit(f"[INFO] 转写期间已翻译 {len(self.results)} 条字幕（{self.translator.target_lang}）")
+            return dict(self.results)
+
+    def cancel(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+# ---------------- 字幕合成 ----------------
+
+SUBTITLE_MODE_BURN = "burn"  # 烧录硬字幕，libx264重新编码
+SUBTITLE_MODE_SOFT = "soft"  # 封装软字幕轨，视频/音频流复制
+SUBTITLE_MODE_BURN_PARALLEL = "burn_parallel"  # 在关键帧处分段，多个ffmpeg进程并行烧录后无损拼接
+SUBTITLE_MODE_SMART = "smart"  # 只重新编码有字幕的GOP，其余GOP流复制
+SUBTITLE_MODES = {
+    SUBTITLE_MODE_BURN: "硬字幕（烧录）",
+    SUBTITLE_MODE_BURN_PARALLEL: "硬字幕（分段并行烧录）",
+    SUBTITLE_MODE_SMART: "硬字幕（智能渲染，只编码有字幕的片段）",
+    SUBTITLE_MODE_SOFT: "软字幕（封装，不重新编码）",
+}
+
+# 读取输出相关配置
+def load_output_settings():
+    config = load_config()
+    mode = config.get('Output', 'subtitle_mode', fallback=SUBTITLE_MODE_BURN).strip().lower()
+    if mode not in SUBTITLE_MODES:
+        mode = SUBTITLE_MODE_BURN
+    return {
+        "subtitle_mode": mode,
+        "encode_segments": max(0, config.getint('Output', 'encode_segments', fallback=0)),
+    }
+
+# 软字幕的输出路径：MKV源仍输出MKV（srt轨），其余输出MP4（mov_text轨）
+def soft_subtitle_output_path(video_path):
+    base_path, ext = os.path.splitext(video_path)
+    return f"{base_path}_C.mkv" if ext.lower() == ".mkv" else f"{base_path}_C.mp4"
+
+# 生成把字幕封装进视频的ffmpeg命令，subtitle_tracks 为 [(SRT路径, 语言代码), ...]，第一条设为默认
+def build_soft_subtitle_command(video_path, subtitle_tracks, output_video):
+    cmd = ["ffmpeg", "-i", video_path]
+    for srt_path, _ in subtitle_tracks:
+        cmd += ["-i", srt_path]
+    cmd += ["-map", "0:v", "-map", "0:a?"]
+    for n in range(len(subtitle_tracks)):
+        cmd += ["-map", f"{n + 1}:0"]
+    if output_video.lower().endswith(".mkv"):
+        # MKV保留原有字幕轨和附件（字体等），排在译文轨之后
+        cmd += ["-map", "0:s?", "-map", "0:t?"]
+        subtitle_codec = "srt"
+    else:
+        subtitle_codec = "mov_text"
+    cmd += ["-c", "copy"]
+    for n, (_, language) in enumerate(subtitle_tracks):
+        cmd += [
+            f"-c:s:{n}", subtitle_codec,
+            f"-metadata:s:s:{n}", f"language={language}",
+            f"-disposition:s:{n}", "default" if n == 0 else "0",
+        ]
+    cmd += ["-y", output_video]
+    return cmd
+
+# 生成ffmpeg subtitles滤镜字符串；SRT中没有字幕时返回空滤镜（subtitles滤镜无法读取空文件）
+def build_subtitles_filter(srt_path):
+    if not parse_srt(srt_path):
+        return "null"
+    escaped_srt_path = os.path.abspath(srt_path).replace('\\', '/')
+    if platform.system() == "Windows":
+        if re.match(r'^[a-zA-Z]:/', escaped_srt_path):
+            escaped_srt_path = escaped_srt_path.replace(':', '\\:', 1)
+    return f"subtitles='{escaped_srt_path}'"
+
+# 生成烧录硬字幕的ffmpeg命令：有码率时沿用原码率，否则使用CRF=26。
+# outputs 为 [(SRT路径, 输出路径), ...]，多个输出时只解码一次，split后分别烧录编码；
+# 指定 start/duration 时只渲染该时间段（输入端-ss，字幕时间轴需从0开始）
+def build_burn_in_command(video_path, outputs, bitrate=None, start=None, duration=None):
+    rate_control = ["-b:v", bitrate] if bitrate else ["-crf", "26"]
+    encode_args = ["-c:v", "libx264", "-preset", "medium", *rate_control, "-c:a", "copy"]
+    input_args = ["-i", video_path]
+    if start is not None:
+        input_args = ["-ss", f"{start:.3f}"] + input_args
+    if duration is not None:
+        input_args += ["-t", f"{duration:.3f}"]
+    if len(outputs) == 1:
+        srt_path, output_video = outputs[0]
+        return ["ffmpeg", *input_args, "-vf", build_subtitles_filter(srt_path), *encode_args, "-y", output_video]
+    graph = [f"[0:v]split={len(outputs)}" + "".join(f"[v{n}]" for n in range(len(outputs)))]
+    graph += [f"[v{n}]{build_subtitles_filter(srt_path)}[o{n}]" for n, (srt_path, _) in enumerate(outputs)]
+    cmd = ["ffmpeg", *input_args, "-filter_complex", ";".join(graph), "-y"]
+    for n, (_, output_video) in enumerate(outputs):
+        cmd += ["-map", f"[o{n}]", "-map", "0:a?", *encode_args, output_video]
+    return cmd
+
+MIN_ENCODE_SEGMENT_SEC = 10  # 分段烧录时每段的最短时长
+
+# 在最接近等分点的关键帧处切分，返回 [(开始秒, 结束秒), ...]
+def plan_encode_segments(keyframes, duration, count):
+    cuts = [0.0]
+    for i in range(1, count):
+        target = duration * i / count
+        nearest = min(keyframes, key=lambda t: abs(t - target), default=None)
+        if nearest is None:
+            break
+        if nearest - cuts[-1] >= MIN_ENCODE_SEGMENT_SEC and duration - nearest >= MIN_ENCODE_SEGMENT_SEC:
+            cuts.append(nearest)
+    return list(zip(cuts, cuts[1:] + [duration]))
+
+# 截取与 [start, end) 重叠的字幕并平移到从0开始
+def slice_srt_cues(cues, start, end):
+    return [
+        (max(cue_start, start) - start, min(cue_end, end) - start, text)
+        for cue_start, cue_end, text in cues
+        if cue_end > start and cue_start < end
+    ]
+
+# 生成一段视频的编码命令：从关键帧 start 处输入端定位，截取到 end，烧录平移后的字幕切片 cues
+def build_segment_command(video_path, start, end, segment_path, cues, rate_control, threads=None,
+                          extra_args=(), last=False):
+    cmd = ["ffmpeg", "-nostdin", "-ss", f"{start:.6f}", "-i", video_path]
+    if not last:
+        cmd += ["-t", f"{end - start:.6f}"]
+    cmd += ["-map", "0:v:0", "-an", "-sn"]
+    if cues:
+        slice_path = os.path.splitext(segment_path)[0] + ".srt"
+        write_srt(cues, slice_path)
+        cmd += ["-vf", build_subtitles_filter(slice_path)]
+    cmd += ["-c:v", "libx264", "-preset", "medium", *rate_control]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    cmd += [*extra_args, "-y", segment_path]
+    return cmd
+
+# 并行运行各段的ffmpeg命令（同时最多 max_parallel 个），各段的 -progress 输出按时长汇总，
+# progress_callback(百分比, 剩余秒数)；用户中止时返回False，任一段失败时抛出RuntimeError
+def run_segment_commands(commands, durations, total_duration, log_signal, progress_callback=None,
+                         cancel_check=None, max_parallel=None):
+    max_parallel = max_parallel or os.cpu_count() or 1
+    tracker = ProgressTracker(total_duration, progress_callback)
+    progress = [FFmpegProgress() for _ in commands]
+    running = {}
+    next_index = 0
+    try:
+        while next_index < len(commands) or running:
+            if cancel_check and cancel_check():
+                return False
+            while next_index < len(commands) and len(running) < max_parallel:
+                running[next_index] = SupervisedProcess(ffmpeg_with_progress(commands[next_index]),
+                                                        on_stdout=progress[next_index].feed)
+                next_index += 1
+            for index, process in list(running.items()):
+                if process.poll() is None:
+                    continue
+                del running[index]
+                if process.wait() != 0:
+                    log_signal.emit(f"[ERROR] 第 {index + 1} 段处理失败:\n" + process.stderr_text())
+                    raise RuntimeError("字幕合成失败，请查看日志获取详细错误信息。")
+                record_metric("ffmpeg", segment=index + 1, media_seconds=round(durations[index], 3),
+                              speed=progress[index].speed, fps=progress[index].fps)
+                progress[index].out_time = durations[index]
+            tracker.update(sum(min(p.out_time, duration) for p, duration in zip(progress, durations)))
+            time.sleep(0.2)
+        return True
+    finally:
+        for process in running.values():
+            process.kill()
+
+# 用concat无损拼接视频段，音频直接复制原始音轨
+def concat_segments(segment_paths, video_path, output_video, work_dir, log_signal):
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for segment_path in segment_paths:
+            escaped = segment_path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = [
+        "ffmpeg", "-nostdin",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", video_path,
+        "-map", "0:v", "-map", "1:a?",
+        "-c", "copy",
+        "-y",
+        output_video
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        log_signal.emit("[ERROR] FFmpeg Stderr Output:\n" + result.stderr)
+        raise RuntimeError("字幕合成失败，请查看日志获取详细错误信息。")
+
+# 分段并行烧录：在关键帧处把视频切成若干段，每段配上平移后的字幕切片由独立的ffmpeg进程编码，
+# 最后无损拼接。progress_callback(百分比, 剩余秒数) 按各段汇总；用户中止时返回False
+def burn_in_parallel(video_path, srt_path, output_video, bitrate, log_signal, progress_callback=None,
+                     cancel_check=None, segments=0):
+    probe = probe_media(video_path, keyframes=True)
+    total_duration = probe.duration
+    cpu_count = os.cpu_count() or 1
+    plan = plan_encode_segments(probe.relative_keyframes, total_duration, segments or cpu_count)
+    threads = max(1, cpu_count // len(plan))
+    rate_control = ["-b:v", bitrate] if bitrate else ["-crf", "26"]
+    cues = load_srt_cues(srt_path)
+    work_dir = get_cache_dir("encode", source_fingerprint(video_path))
+    log_signal.emit(f"[INFO] 分段并行烧录：{len(plan)} 段，每段 {threads} 线程")
+
+    segment_paths = [os.path.join(work_dir, f"segment_{index:03d}.mp4") for index in range(len(plan))]
+    commands = [
+        build_segment_command(video_path, start, end, segment_path, slice_srt_cues(cues, start, end),
+                              rate_control, threads, last=index == len(plan) - 1)
+        for index, ((start, end), segment_path) in enumerate(zip(plan, segment_paths))
+    ]
+    try:
+        if not run_segment_commands(commands, [end - start for start, end in plan], total_duration, log_signal,
+                                    progress_callback, cancel_check, max_parallel=len(plan)):
+            return False
+        concat_segments(segment_paths, video_path, output_video, work_dir, log_signal)
+        if progress_callback:
+            progress_callback(100, 0.0)
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# 把关键帧之间的GOP按是否有字幕覆盖合并成连续区间，返回 [(开始秒, 结束秒, 是否需要重新编码), ...]
+def plan_smart_render(keyframes, cues, duration):
+    bounds = sorted(set([0.0] + [t for t in keyframes if 0 < t < duration])) + [duration]
+    runs = []
+    for start, end in zip(bounds, bounds[1:]):
+        encode = any(cue_end > start and cue_start < end for cue_start, cue_end, _ in cues)
+        if runs and runs[-1][2] == encode:
+            runs[-1] = (runs[-1][0], end, encode)
+        else:
+            runs.append((start, end, encode))
+    return runs
+
+# 智能渲染：没有字幕的GOP直接流复制，只重新编码有字幕覆盖的GOP，最后拼接成一个文件。
+# 需要源视频为H.264；各段以MPEG-TS中转，SPS/PPS随码流携带。用户中止时返回False
+def smart_render(video_path, srt_path, output_video, bitrate, log_signal, progress_callback=None,
+                 cancel_check=None):
+    probe = probe_media(video_path, keyframes=True)
+    total_duration = probe.duration
+    stream_info = probe.video_stream
+    if stream_info.get("codec_name") != "h264":
+        log_signal.emit(f"[WARN] 智能渲染需要H.264源视频（当前为 {stream_info.get('codec_name')}），改为分段并行烧录")
+        return burn_in_parallel(video_path, srt_path, output_video, bitrate, log_signal,
+                                progress_callback, cancel_check, segments=load_output_settings()["encode_segments"])
+
+    cues = load_srt_cues(srt_path)
+    runs = plan_smart_render(probe.relative_keyframes, cues, total_duration)
+    rate_control = ["-b:v", bitrate] if bitrate else ["-crf", "26"]
+    # 重新编码的段与源视频保持相同的像素格式和profile，拼接后解码器无需切换
+    encode_args = ["-pix_fmt", stream_info.get("pix_fmt") or "yuv420p"]
+    profile = (stream_info.get("profile") or "").lower().replace(" ", "")
+    if profile in ("baseline", "main", "high", "high10", "high422", "high444"):
+        encode_args += ["-profile:v", profile]
+    work_dir = get_cache_dir("encode", source_fingerprint(video_path))
+    transport_args = ["-bsf:v", "h264_mp4toannexb"]
+
+    # 一次流复制按区间边界切分整个视频（切点都是关键帧，segment复用器按pts精确切分），
+    # 同时并行重新编码有字幕的区间，拼接时用编码结果替换对应的切片
+    boundaries = [start for start, _, _ in runs[1:]] or [total_duration]
+    commands = [[
+        "ffmpeg", "-nostdin", "-i", video_path,
+        "-map", "0:v:0", "-c:v", "copy", *transport_args,
+        "-f", "segment", "-segment_format", "mpegts",
+        "-segment_times", ",".join(f"{t:.6f}" for t in boundaries),
+        "-reset_timestamps", "1",
+        "-y", os.path.join(work_dir, "copy_%04d.ts")
+    ]]
+    durations = [sum(end - start for start, end, encode in runs if not encode)]
+    segment_paths = []
+    for index, (start, end, encode) in enumerate(runs):
+        if not encode:
+            segment_paths.append(os.path.join(work_dir, f"copy_{index:04d}.ts"))
+            continue
+        segment_path = os.path.join(work_dir, f"encode_{index:04d}.ts")
+        segment_paths.append(segment_path)
+        commands.append(build_segment_command(
+            video_path, start, end, segment_path, slice_srt_cues(cues, start, end), rate_control, threads=1,
+            extra_args=encode_args + transport_args + ["-f", "mpegts"], last=index == len(runs) - 1
+        ))
+        durations.append(end - start)
+
+    copied = durations[0]
+    log_signal.emit(f"[INFO] 智能渲染：{len(runs)} 个区间，其中 {len(commands) - 1} 个需要重新编码")
+    try:
+        if not run_segment_commands(commands, durations, total_duration, log_signal,
+                                    progress_callback, cancel_check):
+            return False
+        concat_segments(segment_paths, video_path, output_video, work_dir, log_signal)
+        if progress_callback:
+            progress_callback(100, 0.0)
+        log_signal.emit(f"[INFO] 智能渲染完成：流复制 {copied:.1f}s / {total_duration:.1f}s（{copied / total_duration:.1%}）")
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# 把普通回调包装成带 emit 方法的对象，供不依赖Qt的调用方传给各处理函数
+class CallbackSignal:
+    def __init__(self, callback=None):
+        self.callback = callback
+
+    def emit(self, *args):
+        if self.callback is not None:
+            self.callback(*args)
+
+# 读取日志与进度相关配置
+def load_log_settings():
+    config = load_config()
+    log_dir = config.get('Log', 'log_dir', fallback='').strip()
+    return {
+        "log_dir": os.path.expanduser(log_dir) if log_dir else get_cache_dir("logs"),
+        "max_files": config.getint('Log', 'max_files', fallback=20),
+        "max_lines": config.getint('Log', 'max_lines', fallback=5000),
+        "flush_interval": config.getint('Log', 'flush_interval_ms', fallback=200) / 1000,
+        "progress_interval": config.getint('Log', 'progress_interval_ms', fallback=250) / 1000,
+    }
+
+# 新建本次运行的完整日志文件，只保留最近 max_files 个
+def new_log_file_path(settings=None):
+    settings = settings or load_log_settings()
+    os.makedirs(settings["log_dir"], exist_ok=True)
+    old_logs = sorted(f for f in os.listdir(settings["log_dir"]) if f.startswith("setm_") and f.endswith(".log"))
+    for name in old_logs[:max(0, len(old_logs) - settings["max_files"] + 1)]:
+        try:
+            os.remove(os.path.join(settings["log_dir"], name))
+        except OSError:
+            pass
+    return os.path.join(settings["log_dir"], time.strftime("setm_%Y%m%d_%H%M%S.log"))
+
+# 批量日志：任意线程调用 append，每行立即写入完整日志文件，同时放入有界的待显示缓冲；
+# 界面定时调用 drain 一次取走一批，待显示的行超出上限时丢弃最早的行（文件中仍然完整）
+class LogSink:
+    def __init__(self, path=None, max_pending=5000):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.file = open(path, "a", encoding="utf-8") if path else None
+
+    def append(self, line):
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(line)
+            if self.file is not None:
+                self.file.write(line + "\n")
+
+    def drain(self):
+        with self.lock:
+            lines = list(self.pending)
+            self.pending.clear()
+            dropped, self.dropped = self.dropped, 0
+            if self.file is not None:
+                self.file.flush()
+        if dropped:
+            lines.insert(0, f"[WARN] 日志过多，省略了 {dropped} 行，完整日志见 {self.path}")
+        return lines
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+# 限制进度回调的频率：百分比有变化且距上次转发超过 min_interval 秒时才转发，0%和100%总是转发
+class ProgressThrottle:
+    def __init__(self, callback, min_interval=None):
+        self.callback = callback
+        self.min_interval = load_log_settings()["progress_interval"] if min_interval is None else min_interval
+        self.lock = threading.Lock()
+        self.last_percent = None
+        self.last_time = 0.0
+
+    def __call__(self, percent, eta=None):
+        now = time.monotonic()
+        with self.lock:
+            if percent == self.last_percent:
+                return
+            if 0 < percent < 100 and now - self.last_time < self.min_interval:
+                return
+            self.last_percent, self.last_time = percent, now
+        self.callback(percent, eta)
+
+# 阶段方法装饰器：在任务指标中记录阶段耗时，执行期间把任务指标绑定到当前线程
+def metrics_stage(stage):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with bind_metrics(self.metrics), self.metrics.span(stage) as span:
+                result = method(self, *args, **kwargs)
+                span["completed"] = result is not None and result is not False
+                return result
+        return wrapper
+    return decorator
+
+# 单个视频的处理任务：转写、翻译、合成三个阶段可分别调用，供界面、命令行和批量队列复用。
+# log_callback(消息)、progress_callback(百分比, 剩余秒数) 为普通回调，cancel_check 返回True时各阶段尽快中止并返回False
+class SubtitleJob:
+    def __init__(self, video_path, language, model_size, api_key, log_callback=None, progress_callback=None,
+                 subtitle_mode=None, target_langs=None, preview_window=None, cancel_check=None):
+        self.video_path = video_path
+        self.language = language
+        self.model_size = model_size
+        self.api_key = api_key
+        self.log_signal = CallbackSignal(log_callback)
+        self.progress_signal = CallbackSignal(progress_callback)
+        self.subtitle_mode = subtitle_mode or load_output_settings()["subtitle_mode"]
+        self.target_langs = target_langs or load_target_languages()
+        self.preview_window = preview_window  # (开始秒, 时长秒)，指定时只渲染预览片段
+        self.cancel_check = cancel_check or (lambda: False)
+
+        base_path = os.path.splitext(self.video_path)[0]
+        self.srt_path = f"{base_path}.srt"
+        # 每个目标语言一份译文SRT；单语言时输出 _C.mp4，多语言烧录时每种语言一个文件
+        self.translated_srts = {lang: f"{base_path}_{lang}.srt" for lang in self.target_langs}
+        if self.subtitle_mode == SUBTITLE_MODE_SOFT:
+            # 所有语言封装为同一个文件中的多条字幕轨
+            self.output_videos = {self.target_langs[0]: soft_subtitle_output_path(self.video_path)}
+        elif len(self.target_langs) == 1:
+            self.output_videos = {self.target_langs[0]: f"{base_path}_C.mp4"}
+        else:
+            self.output_videos = {lang: f"{base_path}_C_{lang}.mp4" for lang in self.target_langs}
+        # 边转写边翻译得到的译文，转写阶段写入、翻译阶段使用
+        self.known_translations = {}
+        self._video_fingerprint = None
+        self.metrics = JobMetrics.for_video(video_path)
+
+    @property
+    def video_fingerprint(self):
+        if self._video_fingerprint is None:
+            self._video_fingerprint = content_fingerprint(self.video_path)
+        return self._video_fingerprint
+
+    # 依次执行三个阶段，返回输出文件列表；用户中止时返回None
+    def run(self):
+        status = "failed"
+        try:
+            if self.preview_window:
+                outputs = self.run_preview()
+            elif self.transcribe() and self.translate() and self.render():
+                outputs = list(self.output_videos.values())
+            else:
+                outputs = None
+            status = "done" if outputs is not None else "cancelled"
+            return outputs
+        finally:
+            self.finish_metrics(status)
+
+    # 写出任务指标的汇总（status: done/cancelled/failed），并在日志中输出一行摘要
+    def finish_metrics(self, status):
+        summary = self.metrics.finish(status)
+        if summary["stages"]:
+            self.log_signal.emit(f"[INFO] {self.metrics.format_summary(summary)}")
+        if self.metrics.path:
+            self.log_signal.emit(f"[INFO] 运行指标已写入: {self.metrics.path}")
+
+    # 转写：以视频内容指纹+转写参数为键，命中缓存时跳过 Whisper
+    @metrics_stage("transcribe")
+    def transcribe(self):
+        cache = get_artifact_cache()
+        if self.has_user_srt():
+            self.log_signal.emit(f"[INFO] 使用已有的字幕文件（非本工具生成或已手动修改）: {os.path.basename(self.srt_path)}，"
+                                 "删除该文件可重新转写")
+            self.log_signal.emit("[INFO] 跳过 Whisper 字幕提取步骤。")
+            return True
+        transcribe_parts = [self.video_fingerprint, *self.transcription_cache_parts()]
+        if cache.restore("transcribe", transcribe_parts, self.srt_path):
+            cache.mark_output(self.srt_path)
+            self.log_signal.emit(f"[INFO] 命中缓存的原文字幕: {os.path.basename(self.srt_path)}")
+            self.log_signal.emit("[INFO] 跳过 Whisper 字幕提取步骤。")
+            return True
+        self.log_signal.emit("[INFO] 开始使用 Whisper 提取字幕。")
+        with self.metrics.span("extract_audio"):
+            audio_path = extract_audio(self.video_path, self.log_signal, cancel_check=self.cancel_check)
+        # 边转写边翻译：Whisper每产出一段就送入各目标语言的翻译批次
+        streaming = {}
+        if load_translation_settings()["overlap_transcription"]:
+            streaming = {
+                lang: StreamingTranslator(self.api_key, self.log_signal, self.language, target_lang=lang)
+                for lang in self.target_langs
+            }
+        on_segment = None
+        if streaming:
+            def on_segment(text):
+                for translator in streaming.values():
+                    translator.add_segment(text)
+        started = time.monotonic()
+        # 转写中止或出错（抛出异常）时都停止边转写边翻译，不再为失败的任务继续发送翻译请求
+        completed = False
+        try:
+            completed = audio_path is not None and self.transcribe_audio(audio_path, self.srt_path, on_segment)
+        finally:
+            if not completed:
+                for translator in streaming.values():
+                    translator.cancel()
+        if not completed:
+            return False
+        record_metric("transcription", engine=load_whisper_settings()["engine"], model=self.model_size,
+                      audio_seconds=round(wav_duration(audio_path), 3),
+                      seconds=round(time.monotonic() - started, 3))
+        self.known_translations = {lang: translator.finish() for lang, translator in streaming.items()}
+        cache.put("transcribe", transcribe_parts, self.srt_path)
+        cache.mark_output(self.srt_path)
+        return True
+
+    # 视频旁的同名SRT不是本工具写出的（用户提供或手动修改过）时原样使用，转写阶段不会覆盖它；
+    # 本工具写出且未修改的SRT则按缓存键重新恢复或转写，其他模型、语言留下的字幕不会被沿用
+    def has_user_srt(self):
+        return os.path.exists(self.srt_path) and not get_artifact_cache().is_own_output(self.srt_path)
+
+    # 翻译：以原文字幕内容+目标语言+翻译参数为键，未命中的语言基于同一份原文并发翻译
+    @metrics_stage("translate")
+    def translate(self):
+        cache = get_artifact_cache()
+        srt_fingerprint = content_fingerprint(self.srt_path)
+        translate_parts = {
+            lang: [srt_fingerprint, *self.translation_cache_parts(lang)] for lang in self.target_langs
+        }
+        pending_srts = {}
+        for lang in self.target_langs:
+            if cache.restore("translate", translate_parts[lang], self.translated_srts[lang]):
+                self.log_signal.emit(f"[INFO] 命中缓存的译文字幕: {os.path.basename(self.translated_srts[lang])}")
+            else:
+                pending_srts[lang] = self.translated_srts[lang]
+        if pending_srts:
+            self.log_signal.emit(f"[INFO] 开始翻译字幕: {', '.join(pending_srts)}")
+            # 已知译文：预览时翻译过的条目，以及边转写边翻译得到的译文
+            known_translations = {
+                lang: {**self.load_preview_translations(lang), **self.known_translations.get(lang, {})}
+                for lang in pending_srts
+            }
+            if not self.translate_all(self.srt_path, pending_srts, known_translations):
+                return False
+            for lang in pending_srts:
+                cache.put("translate", translate_parts[lang], self.translated_srts[lang])
+        return True
+
+    # 合成：以视频内容指纹+译文字幕内容+输出参数为键，命中的成品直接复制
+    @metrics_stage("render")
+    def render(self):
+        cache = get_artifact_cache()
+        translated_srts, output_videos = self.translated_srts, self.output_videos
+        subtitle_fingerprints = {lang: content_fingerprint(translated_srts[lang]) for lang in self.target_langs}
+        original_bitrate = None
+        if self.subtitle_mode == SUBTITLE_MODE_SOFT:
+            render_parts = {self.target_langs[0]: [
+                self.video_fingerprint, self.subtitle_mode,
+                [[lang, subtitle_fingerprints[lang]] for lang in self.target_langs]
+            ]}
+        else:
+            # 自动检测原始视频码率，检测不到时使用CRF
+            self.log_signal.emit("[INFO] 正在检测原始视频码率...")
+            original_bitrate = probe_media(self.video_path).video_bitrate
+            if original_bitrate:
+                self.log_signal.emit(f"[INFO] 检测到码率: {original_bitrate} bps. 将使用此码率进行编码。")
+            else:
+                self.log_signal.emit("[WARN] 未能检测到原始码率，将使用CRF=26作为备用方案进行编码。")
+            render_parts = {
+                lang: [self.video_fingerprint, self.subtitle_mode, subtitle_fingerprints[lang], original_bitrate]
+                for lang in self.target_langs
+            }
+        pending_langs = []
+        for lang, output_video in output_videos.items():
+            if cache.restore("render", render_parts[lang], output_video):
+                self.log_signal.emit(f"[INFO] 命中缓存的成品视频: {os.path.basename(output_video)}")
+            else:
+                pending_langs.append(lang)
+
+        completed = True
+        if not pending_langs:
+            self.log_signal.emit("[INFO] 所有输出均命中缓存，跳过字幕合成")
+        elif self.subtitle_mode == SUBTITLE_MODE_SOFT:
+            self.log_signal.emit("[INFO] 开始封装软字幕轨（流复制，不重新编码）")
+            subtitle_tracks = [(translated_srts[lang], TARGET_LANGUAGES[lang][1]) for lang in self.target_langs]
+            cmd_ffmpeg = build_soft_subtitle_command(self.video_path, subtitle_tracks, output_videos[self.target_langs[0]])
+            self.log_signal.emit(f"[DEBUG] {cmd_ffmpeg}")
+            completed = self.run_ffmpeg(cmd_ffmpeg, probe_media(self.video_path).duration)
+        elif self.subtitle_mode in (SUBTITLE_MODE_BURN_PARALLEL, SUBTITLE_MODE_SMART):
+            self.log_signal.emit("[INFO] 开始合成字幕到视频")
+            # 分段/智能渲染的切分依赖各语言自己的字幕时间轴，逐个语言处理
+            render = burn_in_parallel if self.subtitle_mode == SUBTITLE_MODE_BURN_PARALLEL else smart_render
+            kwargs = {"segments": load_output_settings()["encode_segments"]} if render is burn_in_parallel else {}
+            for lang in pending_langs:
+                completed = render(
+                    self.video_path, translated_srts[lang], output_videos[lang], original_bitrate,
+                    self.log_signal, progress_callback=self.progress_signal.emit,
+                    cancel_check=self.cancel_check, **kwargs
+                )
+                if not completed:
+                    break
+        else:
+            self.log_signal.emit("[INFO] 开始合成字幕到视频")
+            # 多语言时共用一次解码，split后每种语言各烧录一个输出
+            cmd_ffmpeg = build_burn_in_command(
+                self.video_path, [(translated_srts[lang], output_videos[lang]) for lang in pending_langs],
+                original_bitrate
+            )
+            self.log_signal.emit(f"[DEBUG] {cmd_ffmpeg}")
+            completed = self.run_ffmpeg(cmd_ffmpeg, probe_media(self.video_path).duration)
+        if not completed:
+            return False
+        for lang in pending_langs:
+            cache.put("render", render_parts[lang], output_videos[lang], reference=True)
+        self.log_signal.emit(f"[INFO] {cache.stats()}")
+        return True
+
+    # 影响原文字幕内容的转写参数，作为产物缓存键的一部分
+    def transcription_cache_parts(self):
+        whisper_settings = load_whisper_settings()
+        parts = [self.language, self.model_size, whisper_settings["engine"]]
+        if whisper_settings["engine"] == FasterWhisperEngine.name:
+            parts.append(load_config().get('Whisper', 'compute_type', fallback='int8'))
+        if whisper_settings["parallel"]:
+            parts += ["parallel", whisper_settings["max_chunk_sec"]]
+        return parts
+
+    # 影响译文内容的翻译参数，作为产物缓存键的一部分
+    def translation_cache_parts(self, target_lang):
+        translator = create_translator(self.api_key, target_lang)
+        return [self.language, target_lang, translator.model, translation_prompt_hash(target_lang),
+                [pattern.pattern for pattern in load_skip_patterns()]]
+
+    # 预览译文的保存位置：按视频和翻译参数区分，换了模型、提示词或目标语言的译文不会被沿用
+    def preview_translations_path(self, target_lang):
+        key = ArtifactCache.make_key("preview", self.translation_cache_parts(target_lang))
+        return os.path.join(get_cache_dir("preview", source_fingerprint(self.video_path)),
+                            f"translations_{key[:16]}.json")
+
+    def load_preview_translations(self, target_lang):
+        try:
+            with open(self.preview_translations_path(target_lang), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    # 按条目把预览时间段的原文和译文配对，累积保存；与原文相同的（逐行回退时保留的原文）不保存
+    def save_preview_translations(self, target_lang, source_srt, translated_srt):
+        known = self.load_preview_translations(target_lang)
+        for (_, _, source), (_, _, translation) in zip(load_srt_cues(source_srt), load_srt_cues(translated_srt)):
+            if translation and translation != source:
+                known[source] = translation
+        path = self.preview_translations_path(target_lang)
+        with open(path + ".part", "w", encoding="utf-8") as f:
+            json.dump(known, f, ensure_ascii=False)
+        os.replace(path + ".part", path)
+
+    # 按配置选择转写方式（并行分块/常驻工作进程/命令行），用户中止时返回False
+    def transcribe_audio(self, audio_path, srt_path, on_segment=None):
+        whisper_settings = load_whisper_settings()
+        if whisper_settings["parallel"]:
+            return transcribe_parallel(
+                audio_path, srt_path, self.model_size, self.language, self.log_signal,
+                cancel_check=self.cancel_check,
+                pool_size=whisper_settings["pool_size"], max_chunk_sec=whisper_settings["max_chunk_sec"],
+                engine=whisper_settings["engine"], on_segment=on_segment,
+                progress_callback=self.progress_signal.emit
+            )
+        if whisper_settings["use_worker"] or whisper_settings["engine"] != WhisperEngine.name:
+            return get_whisper_worker().transcribe(
+                audio_path, self.model_size, self.language, os.path.dirname(srt_path),
+                self.log_signal, cancel_check=self.cancel_check, name=srt_path,
+                engine=whisper_settings["engine"], on_segment=on_segment,
+                progress_callback=self.progress_signal.emit
+            )
+        return self.transcribe_with_cli(audio_path, srt_path, on_segment)
+
+    # 各目标语言基于同一份原文字幕并发翻译，用户中止时返回False
+    def translate_all(self, srt_path, translated_srts, known_translations=None):
+        known_translations = known_translations or {}
+        with ThreadPoolExecutor(max_workers=len(translated_srts)) as executor:
+            futures = [
+                executor.submit(
+                    with_current_metrics(translate_srt_file), srt_path, output_srt, self.api_key, self.log_signal,
+                    source_lang=self.language, cancel_check=self.cancel_check,
+                    known_translations=known_translations.get(lang), target_lang=lang
+                )
+                for lang, output_srt in translated_srts.items()
+            ]
+            return all([future.result() for future in futures])
+
+    # 预览：只转写/翻译所选时间段内的字幕，用与正式输出相同的滤镜和编码参数烧录一小段视频。
+    # 译文另存为 {原文: 译文}，正式处理时作为已知译文直接使用（不依赖翻译记忆库），不会重复调用API
+    # 返回预览文件列表，用户中止时返回None
+    @metrics_stage("preview")
+    def run_preview(self):
+        start, duration = self.preview_window
+        base_path = os.path.splitext(self.video_path)[0]
+        work_dir = get_cache_dir("preview", source_fingerprint(self.video_path))
+        window_srt = os.path.join(work_dir, f"window_{int(start * 1000)}_{int(duration * 1000)}.srt")
+
+        # 与正式处理相同的判断：用户提供的同名字幕，或同一缓存键下已转写的原文字幕
+        if self.has_user_srt():
+            source_srt = self.srt_path
+        else:
+            source_srt = get_artifact_cache().get(
+                "transcribe", [self.video_fingerprint, *self.transcription_cache_parts()]
+            )
+        if source_srt is not None:
+            # 截取时间段内的字幕，平移到从0开始（输入端-ss后时间戳从0开始）
+            write_srt(slice_srt_cues(load_srt_cues(source_srt), start, start + duration), window_srt)
+        else:
+            self.log_signal.emit("[INFO] 没有可用的原文字幕，只转写预览时间段")
+            window_audio = extract_audio_window(self.video_path, start, duration,
+                                                os.path.splitext(window_srt)[0] + ".wav",
+                                                self.log_signal, cancel_check=self.cancel_check)
+            if window_audio is None:
+                return None
+            if not self.transcribe_audio(window_audio, window_srt):
+                return None
+        self.log_signal.emit(f"[INFO] 预览时间段 {start:.1f}s - {start + duration:.1f}s 内共 {len(parse_srt(window_srt))} 条字幕")
+
+        translated_srts = {lang: os.path.join(work_dir, f"window_{lang}.srt") for lang in self.target_langs}
+        if not self.translate_all(window_srt, translated_srts):
+            return None
+        for lang in self.target_langs:
+            self.save_preview_translations(lang, window_srt, translated_srts[lang])
+
+        if len(self.target_langs) == 1:
+            preview_videos = {self.target_langs[0]: f"{base_path}_preview.mp4"}
+        else:
+            preview_videos = {lang: f"{base_path}_preview_{lang}.mp4" for lang in self.target_langs}
+        original_bitrate = probe_media(self.video_path).video_bitrate
+        cmd_ffmpeg = build_burn_in_command(
+            self.video_path, [(translated_srts[lang], preview_videos[lang]) for lang in self.target_langs],
+            original_bitrate, start=start, duration=duration
+        )
+        self.log_signal.emit(f"[DEBUG] {cmd_ffmpeg}")
+        if not self.run_ffmpeg(cmd_ffmpeg, duration):
+            return None
+        return list(preview_videos.values())
+
+    # 运行ffmpeg并按 -progress 输出更新进度和剩余时间，用户中止时返回False
+    def run_ffmpeg(self, cmd_ffmpeg, total_duration):
+        return run_ffmpeg_command(cmd_ffmpeg, total_duration, self.log_signal, self.progress_signal.emit,
+                                  self.cancel_check)
+
+    # 调用 whisper 命令行转写预提取的音频并写出srt_path，用户中止时返回False
+    def transcribe_with_cli(self, audio_path, srt_path, on_segment=None):
+        # 强制子进程使用 UTF-8 环境
+        proc_env = os.environ.copy()
+        proc_env['PYTHONUTF8'] = '1'
+        output_dir = os.path.dirname(audio_path)
+        cmd_whisper = [
+            "whisper", audio_path, "--model", self.model_size, "--language", self.language,
+            "--output_format", "srt", "--output_dir", output_dir
+        ]
+        self.log_signal.emit(f"[DEBUG] {cmd_whisper}")
+        started = time.monotonic()
+        audio_duration = wav_duration(audio_path)
+        # 片段行的结束时间即已转写的音频时长，据此更新进度和剩余时间
+        tracker = ProgressTracker(audio_duration, self.progress_signal.emit)
+
+        def on_stdout(line):
+            self.log_signal.emit(line.strip())
+            match = WHISPER_SEGMENT_PATTERN.match(line.strip())
+            if match is None:
+                return
+            tracker.update(parse_whisper_timestamp(match.group(2)))
+            if on_segment is not None:
+                on_segment(match.group(3))
+
+        process = SupervisedProcess(cmd_whisper, on_stdout=on_stdout, env=proc_env)
+        returncode = process.wait(self.cancel_check)
+        if returncode is None:
+            return False
+        if returncode != 0:
+            self.log_signal.emit("[ERROR] Whisper Stderr Output:\n" + process.stderr_text())
+            raise RuntimeError("字幕提取失败")
+        tracker.update(audio_duration)
+        self.log_signal.emit(format_rtf("whisper-cli", audio_duration, time.monotonic() - started))
+        # 命令行按音频文件名输出到缓存目录，移动到视频同名的字幕路径（视频可能在另一块磁盘上，不能用 os.replace）
+        shutil.move(os.path.join(output_dir, os.path.splitext(os.path.basename(audio_path))[0] + ".srt"), srt_path)
+        return True
+
+# ---------------- 批量队列 ----------------
+
+# 队列阶段及其资源类别：转写占用Whisper（CPU/GPU）、翻译占用API配额、合成占用编码器
+QUEUE_STAGES = ("transcribe", "translate", "render")
+QUEUE_STAGE_TITLES = {"transcribe": "转写", "translate": "翻译", "render": "合成"}
+
+# 读取队列相关配置：每个阶段各自的并发上限、队列文件位置
+def load_queue_settings():
+    config = load_config()
+    queue_path = config.get('Queue', 'queue_path', fallback='').strip()
+    return {
+        "workers": {
+            stage: max(1, config.getint('Queue', f'{stage}_workers', fallback=2 if stage == "translate" else 1))
+            for stage in QUEUE_STAGES
+        },
+        "queue_path": os.path.expanduser(queue_path) if queue_path else os.path.join(get_cache_dir(), "queue.json"),
+    }
+
+# 批量队列：多个视频按阶段流水线处理，第N+1集转写的同时第N集翻译、第N-1集合成。
+# 每个阶段一个线程池，并发上限按资源类别分别配置；队列状态保存为JSON，重启后从未完成的阶段继续。
+# 各阶段的耗时和媒体时长随任务一起保存，用于统计每个阶段的吞吐量
+class JobQueue:
+    def __init__(self, api_key, log_callback=None, on_update=None, settings=None):
+        settings = settings or load_queue_settings()
+        self.api_key = api_key
+        self.log_signal = CallbackSignal(log_callback)
+        self.on_update = on_update
+        self.path = settings["queue_path"]
+        self.workers = settings["workers"]
+        self.lock = threading.RLock()
+        self.idle = threading.Condition(self.lock)
+        self.records = []
+        self.jobs = {}     # 任务ID -> SubtitleJob，边转写边翻译的结果在阶段之间通过它传递
+        self.executors = {}
+        self.active = 0
+        self.stopping = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.records = json.load(f)["jobs"]
+        except (OSError, ValueError, KeyError) as e:
+            self.log_signal.emit(f"[WARN] 队列文件读取失败，将使用空队列: {e}")
+            self.records = []
+        # 上次退出时正在执行的阶段重新排队
+        for record in self.records:
+            if record["status"] == "running":
+                record["status"] = "pending"
+
+    def _save(self):
+        with self.lock:
+            data = json.dumps({"jobs": self.records}, ensure_ascii=False, indent=1)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+
+    def _changed(self, record):
+        self._save()
+        if self.on_update:
+            self.on_update(record)
+
+    # 加入一个视频，返回任务记录；队列运行中时立即进入转写阶段排队
+    def add(self, video_path, language, model_size, subtitle_mode=None, target_langs=None):
+        with self.lock:
+            record = {
+                "id": hashlib.sha1(f"{os.path.abspath(video_path)}|{time.time()}".encode("utf-8")).hexdigest()[:12],
+                "video_path": os.path.abspath(video_path),
+                "language": language,
+                "model_size": model_size,
+                "subtitle_mode": subtitle_mode or load_output_settings()["subtitle_mode"],
+                "target_langs": target_langs or load_target_languages(),
+                "stage": QUEUE_STAGES[0],
+                "status": "pending",
+                "progress": 0,
+                "eta": None,
+                "error": "",
+                "outputs": [],
+                "media_seconds": None,
+                "stage_seconds": {},
+            }
+            self.records.append(record)
+            self._changed(record)
+            if self.executors:
+                self._submit(record)
+            return record
+
+    # 删除已完成和失败的任务
+    def clear_finished(self):
+        with self.lock:
+            self.records = [r for r in self.records if r["status"] not in ("done", "failed")]
+            self._save()
+
+    # 失败的任务从失败的阶段重新排队
+    def retry_failed(self):
+        with self.lock:
+            for record in self.records:
+                if record["status"] == "failed":
+                    record["status"], record["error"] = "pending", ""
+                    self._changed(record)
+                    if self.executors:
+                        self._submit(record)
+
+    def is_running(self):
+        with self.lock:
+            return bool(self.executors)
+
+    # 启动各阶段线程池，未完成的任务按加入顺序从各自的阶段继续
+    def start(self):
+        with self.lock:
+            if self.executors:
+                return
+            self.stopping = False
+            self.executors = {
+                stage: ThreadPoolExecutor(max_workers=self.workers[stage], thread_name_prefix=f"queue-{stage}")
+                for stage in QUEUE_STAGES
+            }
+            limits = ", ".join(f"{QUEUE_STAGE_TITLES[s]}×{self.workers[s]}" for s in QUEUE_STAGES)
+            self.log_signal.emit(f"[INFO] 批量队列启动（{limits}），待处理 {len(self.pending_records())} 个视频")
+            for record in self.pending_records():
+                self._submit(record)
+
+    def pending_records(self):
+        with self.lock:
+            return [r for r in self.records if r["status"] == "pending"]
+
+    # 交给所在阶段的线程池；队列已停止时只保存状态
+    def _submit(self, record):
+        executor = self.executors.get(record["stage"])
+        if executor is None:
+            return
+        self.active += 1
+        executor.submit(self._run_stage, record, record["stage"])
+
+    # 执行一个任务的一个阶段，完成后交给下一阶段的线程池
+    def _run_stage(self, record, stage):
+        try:
+            if self.stopping:
+                return
+            job = None
+            try:
+                with self.lock:
+                    job = self.jobs.get(record["id"])
+                    if job is None:
+                        name = os.path.basename(record["video_path"])
+                        job = SubtitleJob(
+                            record["video_path"], record["language"], record["model_size"], self.api_key,
+                            lambda msg: self.log_signal.emit(f"[{name}] {msg}"),
+                            ProgressThrottle(lambda value, eta: self._set_progress(record, value, eta)),
+                            subtitle_mode=record["subtitle_mode"], target_langs=record["target_langs"],
+                            cancel_check=lambda: self.stopping
+                        )
+                        self.jobs[record["id"]] = job
+                    record["status"] = "running"
+                    record["progress"], record["eta"] = 0, None
+                    self._changed(record)
+                # 探测失败（ffprobe缺失、文件损坏）同样记为失败，否则异常会被线程池吞掉，任务一直停在 running
+                if record["media_seconds"] is None:
+                    record["media_seconds"] = probe_media(record["video_path"]).duration
+                started = time.monotonic()
+                completed = getattr(job, stage)()
+            except Exception as e:
+                with self.lock:
+                    record["status"], record["error"] = "failed", str(e)
+                    self.jobs.pop(record["id"], None)
+                    self._changed(record)
+                if job is not None:
+                    job.finish_metrics("failed")
+                self.log_signal.emit(f"[ERROR] {os.path.basename(record['video_path'])} "
+                                     f"{QUEUE_STAGE_TITLES[stage]}失败: {e}")
+                return
+            elapsed = time.monotonic() - started
+            with self.lock:
+                if not completed:
+                    # 队列停止：保留当前阶段，下次启动时重做
+                    record["status"] = "pending"
+                    self._changed(record)
+                    return
+                record["stage_seconds"][stage] = record["stage_seconds"].get(stage, 0.0) + elapsed
+                index = QUEUE_STAGES.index(stage)
+                if index + 1 < len(QUEUE_STAGES):
+                    record["stage"], record["status"] = QUEUE_STAGES[index + 1], "pending"
+                    self._changed(record)
+                    self._submit(record)
+                else:
+                    record["stage"], record["status"] = "done", "done"
+                    record["outputs"] = list(job.output_videos.values())
+                    self.jobs.pop(record["id"], None)
+                    self._changed(record)
+                    job.finish_metrics("done")
+            self.log_signal.emit(f"[INFO] {os.path.basename(record['video_path'])} "
+                                 f"{QUEUE_STAGE_TITLES[stage]}完成，用时 {elapsed:.1f}s")
+            self.log_signal.emit(f"[INFO] {self.throughput_report()}")
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.idle.notify_all()
+
+    def _set_progress(self, record, value, eta):
+        record["progress"], record["eta"] = value, eta
+        if self.on_update:
+            self.on_update(record)
+
+    # 每个阶段的吞吐量：已完成个数、平均用时、处理速度（媒体时长/阶段用时）
+    def stage_throughput(self):
+        stats = {}
+        with self.lock:
+            for stage in QUEUE_STAGES:
+                finished = [r for r in self.records if stage in r["stage_seconds"]]
+                busy = sum(r["stage_seconds"][stage] for r in finished)
+                media = sum(r["media_seconds"] or 0 for r in finished)
+                stats[stage] = {
+                    "jobs": len(finished),
+                    "busy_seconds": busy,
+                    "media_seconds": media,
+                    "speed": media / busy if busy else 0.0,
+                }
+        return stats
+
+    def throughput_report(self):
+        parts = []
+        for stage, s in self.stage_throughput().items():
+            if s["jobs"]:
+                parts.append(f"{QUEUE_STAGE_TITLES[stage]} {s['jobs']}个/平均{s['busy_seconds'] / s['jobs']:.1f}s/"
+                             f"{s['speed']:.2f}x")
+        return "队列吞吐量：" + ("，".join(parts) if parts else "暂无")
+
+    # 等待所有已排队的阶段执行完毕
+    def wait(self):
+        with self.idle:
+            while self.active:
+                self.idle.wait()
+
+    # 停止队列：正在执行的阶段尽快中止，排队中的阶段不再执行；状态已保存，下次启动时继续
+    def stop(self):
+        with self.lock:
+            if not self.executors:
+                return
+            self.stopping = True
+            executors, self.executors = self.executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+        with self.lock:
+            jobs = list(self.jobs.values())
+            self.jobs.clear()
+        for job in jobs:
+            job.finish_metrics("cancelled")
+        self.log_signal.emit("[INFO] 批量队列已停止")
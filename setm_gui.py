@@ -0,0 +1,529 @@
+# 图形界面，由 setm.py 启动
+import os
+import sys
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QLabel, QComboBox, QPushButton, QFileDialog, QProgressBar,
+    QMessageBox, QGroupBox, QPlainTextEdit, QLineEdit, QDoubleSpinBox, QListWidget, QListWidgetItem
+)
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont, QIcon
+import configparser
+from setm_core import (
+    JobQueue, LogSink, ProgressThrottle, QUEUE_STAGE_TITLES, SUBTITLE_MODES, SubtitleJob, TARGET_LANGUAGES,
+    format_eta, load_log_settings, load_output_settings, load_target_languages, new_log_file_path, open_folder,
+    parse_target_languages, shutdown_whisper_worker
+)
+
+# 一键线程
+class ProcessThread(QThread):
+    progress_signal = pyqtSignal(int, object)  # (百分比, 剩余秒数或None)
+    finished_signal = pyqtSignal(str)
+    error_signal = pyqtSignal(str)
+
+    # log_callback 可在任意线程调用（界面传入批量日志的 append），日志不再逐行经过跨线程信号
+    def __init__(self, video_path, language, model_size, api_key, subtitle_mode=None, target_langs=None,
+                 preview_window=None, log_callback=print):
+        super().__init__()
+        self.log_callback = log_callback
+        self.job = SubtitleJob(
+            video_path, language, model_size, api_key, log_callback, ProgressThrottle(self.progress_signal.emit),
+            subtitle_mode=subtitle_mode, target_langs=target_langs, preview_window=preview_window,
+            cancel_check=lambda: not self.is_running
+        )
+        self.is_running = True
+
+    def run(self):
+        try:
+            outputs = self.job.run()
+            if outputs is None:
+                self.log_callback("[INFO] 用户中止")
+                return
+            self.finished_signal.emit("\n".join(outputs))
+        except Exception as e:
+            self.error_signal.emit(str(e))
+
+    def stop(self):
+        self.is_running = False
+        self.log_callback("[INFO] 停止中...")
+        print("[DEBUG] Stopping thread...")
+
+# 把批量队列工作线程中的任务状态转到界面线程
+class QueueBridge(QObject):
+    update_signal = pyqtSignal(dict)
+
+# 主窗口
+class VideoSubtitleApp(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("视频字幕工具 (提取-翻译-合成)")
+        self.setGeometry(100, 100, 900, 700)
+        # 设置窗口图标
+        self.setWindowIcon(QIcon('icons/app_icon.png'))
+
+        self.last_dir = ""
+        self.process_thread = None
+        self.api_key = self.load_api_key()
+
+        # 日志先进入批量缓冲（同时写入完整日志文件），由定时器每隔一段时间一次性追加到日志窗口
+        self.log_settings = load_log_settings()
+        self.log_sink = LogSink(new_log_file_path(self.log_settings), self.log_settings["max_lines"])
+
+        self.queue_bridge = QueueBridge()
+        self.queue = JobQueue(self.api_key, self.log_message,
+                              on_update=lambda record: self.queue_bridge.update_signal.emit(dict(record)))
+        self.queue_items = {}
+
+        self.init_ui()
+        self.set_stylesheet()
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start(int(self.log_settings["flush_interval"] * 1000))
+        self.log_message(f"[INFO] 完整日志: {self.log_sink.path}")
+        self.queue_bridge.update_signal.connect(self.update_queue_item)
+        for record in self.queue.records:
+            self.update_queue_item(record)
+
+    def load_api_key(self):
+        config = configparser.ConfigParser()
+        config.read('config.ini')
+        try:
+            return config.get('DeepSeek', 'api_key')
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            print("无法从配置文件中读取 API Key，请检查 config.ini 文件。")
+            return ""
+
+    def init_ui(self):
+            main = QWidget()
+            layout = QVBoxLayout(main)
+            layout.setSpacing(15)  # 增加主布局的间距
+            layout.setContentsMargins(15, 15, 15, 15) # 增加窗口内边距
+            self.setCentralWidget(main)
+    
+            font = QFont("Segoe UI", 10) # 使用更现代的字体
+            self.setFont(font)
+    
+            # --- 控件分组 ---
+            group = QGroupBox("一键处理：字幕提取-->字幕翻译-->字幕合成")
+            vbox = QVBoxLayout(group)
+            vbox.setSpacing(12) # 增加组内控件的垂直间距
+            group.setFont(QFont("Segoe UI", 11, QFont.Bold)) # 加粗组标题
+    
+            # --- 视频语言选择 ---
+            hbox_lang = QHBoxLayout()
+            lang_label = QLabel("视频语言:")
+            self.lang_combo = QComboBox()
+            self.lang_combo.addItems(["ja","en",  "zh"])
+            self.lang_combo.setMinimumHeight(35) # 设置最小高度
+            hbox_lang.addWidget(lang_label)
+            hbox_lang.addWidget(self.lang_combo)
+            vbox.addLayout(hbox_lang)
+    
+            # --- Whisper模型选择 ---
+            hbox_model = QHBoxLayout()
+            model_label = QLabel("Whisper模型:")
+            self.model_combo = QComboBox()
+            self.model_combo.addItems(["small", "tiny","medium", "large"])
+            self.model_combo.setMinimumHeight(35) 
+            hbox_model.addWidget(model_label)
+            hbox_model.addWidget(self.model_combo)
+            vbox.addLayout(hbox_model)
+    
+            # --- 目标语言（可填多个，逗号分隔） ---
+            hbox_target = QHBoxLayout()
+            target_label = QLabel("目标语言:")
+            self.target_edit = QLineEdit(", ".join(load_target_languages()))
+            self.target_edit.setPlaceholderText(", ".join(TARGET_LANGUAGES))
+            self.target_edit.setMinimumHeight(35)
+            hbox_target.addWidget(target_label)
+            hbox_target.addWidget(self.target_edit)
+            vbox.addLayout(hbox_target)
+    
+            # --- 字幕输出方式 ---
+            hbox_mode = QHBoxLayout()
+            mode_label = QLabel("字幕输出:")
+            self.mode_combo = QComboBox()
+            for mode, title in SUBTITLE_MODES.items():
+                self.mode_combo.addItem(title, mode)
+            self.mode_combo.setCurrentIndex(list(SUBTITLE_MODES).index(load_output_settings()["subtitle_mode"]))
+            self.mode_combo.setMinimumHeight(35)
+            hbox_mode.addWidget(mode_label)
+            hbox_mode.addWidget(self.mode_combo)
+            vbox.addLayout(hbox_mode)
+    
+            # --- 文件选择 ---
+            hbox_file = QHBoxLayout()
+            self.video_path_label = QLabel("尚未选择视频文件")
+            self.video_path_label.setObjectName("filePathLabel") # 设置ObjectName以便单独美化
+            self.video_path_label.setWordWrap(True)
+            self.video_path_label.setMinimumHeight(40) # 设置最小高度
+            btn_select = QPushButton("选择视频")
+            btn_select.setIcon(QIcon('icons/select_icon.png')) 
+            btn_select.clicked.connect(self.select_video_file)
+            hbox_file.addWidget(self.video_path_label)
+            hbox_file.addWidget(btn_select)
+            vbox.addLayout(hbox_file)
+    
+            # --- 预览：选择一个时间段，快速渲染带字幕的短片 ---
+            hbox_preview = QHBoxLayout()
+            preview_label = QLabel("预览起点(秒):")
+            self.preview_start = QDoubleSpinBox()
+            self.preview_start.setRange(0, 24 * 3600)
+            self.preview_start.setMinimumHeight(35)
+            duration_label = QLabel("时长(秒):")
+            self.preview_duration = QDoubleSpinBox()
+            self.preview_duration.setRange(1, 600)
+            self.preview_duration.setValue(30)
+            self.preview_duration.setMinimumHeight(35)
+            self.btn_preview = QPushButton("预览")
+            self.btn_preview.clicked.connect(self.start_preview)
+            hbox_preview.addWidget(preview_label)
+            hbox_preview.addWidget(self.preview_start)
+            hbox_preview.addWidget(duration_label)
+            hbox_preview.addWidget(self.preview_duration)
+            hbox_preview.addWidget(self.btn_preview)
+            vbox.addLayout(hbox_preview)
+    
+            # --- 进度条 ---
+            self.progress = QProgressBar()
+            self.progress.setTextVisible(True) # 让进度条百分比可见
+            vbox.addWidget(self.progress)
+    
+            # --- 控制按钮 ---
+            hbox_btns = QHBoxLayout()
+            hbox_btns.setSpacing(10) # 按钮间距
+            self.btn_start = QPushButton("开始处理")
+            self.btn_start.setObjectName("startButton") # 设置ObjectName
+            self.btn_start.setIcon(QIcon('icons/start_icon.png'))
+            self.btn_start.clicked.connect(self.start_process)
+            self.btn_cancel = QPushButton("取消")
+            self.btn_cancel.setObjectName("cancelButton") # 设置ObjectName
+            self.btn_cancel.setIcon(QIcon('icons/cancel_icon.png'))
+            self.btn_cancel.clicked.connect(self.cancel_process)
+            self.btn_cancel.setEnabled(False)
+            hbox_btns.addStretch() # 添加伸缩项，让按钮靠右
+            hbox_btns.addWidget(self.btn_start)
+            hbox_btns.addWidget(self.btn_cancel)
+            vbox.addLayout(hbox_btns)
+    
+            layout.addWidget(group)
+    
+            # --- 批量队列：使用上方的语言/模型/目标语言/输出方式，多个视频按阶段流水线处理 ---
+            group_queue = QGroupBox("批量队列：转写、翻译、合成分阶段流水线")
+            group_queue.setFont(QFont("Segoe UI", 11, QFont.Bold))
+            vbox_queue = QVBoxLayout(group_queue)
+            self.queue_list = QListWidget()
+            self.queue_list.setMaximumHeight(140)
+            vbox_queue.addWidget(self.queue_list)
+            hbox_queue = QHBoxLayout()
+            btn_queue_add = QPushButton("添加视频")
+            btn_queue_add.clicked.connect(self.add_queue_videos)
+            self.btn_queue_start = QPushButton("开始队列")
+            self.btn_queue_start.setObjectName("startButton")
+            self.btn_queue_start.clicked.connect(self.start_queue)
+            self.btn_queue_stop = QPushButton("停止队列")
+            self.btn_queue_stop.setObjectName("cancelButton")
+            self.btn_queue_stop.clicked.connect(self.stop_queue)
+            self.btn_queue_stop.setEnabled(False)
+            btn_queue_clear = QPushButton("清除已完成")
+            btn_queue_clear.clicked.connect(self.clear_queue)
+            hbox_queue.addWidget(btn_queue_add)
+            hbox_queue.addWidget(btn_queue_clear)
+            hbox_queue.addStretch()
+            hbox_queue.addWidget(self.btn_queue_start)
+            hbox_queue.addWidget(self.btn_queue_stop)
+            vbox_queue.addLayout(hbox_queue)
+            layout.addWidget(group_queue)
+    
+            # --- 日志窗口 ---
+            # 只保留最近 max_lines 行，更早的内容只在日志文件中
+            self.log = QPlainTextEdit()
+            self.log.setReadOnly(True)
+            self.log.setMaximumBlockCount(self.log_settings["max_lines"])
+            layout.addWidget(self.log)
+
+    def set_stylesheet(self):
+            self.setStyleSheet("""
+                /* ---- 主窗口和通用样式 ---- */
+                QMainWindow {
+                    background-color: #2E3440; /* 主背景色 - 北欧深蓝 */
+                }
+                QWidget {
+                    color: #D8DEE9; /* 默认前景色 - 浅灰 */
+                    font-family: 'Segoe UI', 'Microsoft YaHei', 'sans-serif';
+                    font-size: 10pt;
+                }
+                
+                /* ---- 控件分组框 ---- */
+                QGroupBox {
+                    background-color: #3B4252; /* 组背景色 - 稍亮 */
+                    border: 1px solid #4C566A; /* 边框颜色 */
+                    border-radius: 8px; /* 圆角更大 */
+                    margin-top: 1em; /* 标题与边框的距离 */
+                    padding: 15px;
+                }
+                QGroupBox::title {
+                    subcontrol-origin: margin;
+                    subcontrol-position: top left;
+                    padding: 0 10px;
+                    left: 10px;
+                    color: #ECEFF4; /* 标题颜色 - 白色 */
+                }
+    
+                /* ---- 标签 ---- */
+                QLabel {
+                    background-color: transparent; /* 透明背景 */
+                    color: #D8DEE9;
+                    font-size: 10pt;
+                }
+    
+                /* 特别为文件路径标签设计，使其像一个显示区域 */
+                QLabel#filePathLabel {
+                    background-color: #2E3440;
+                    border: 1px solid #4C566A;
+                    border-radius: 4px;
+                    padding: 8px;
+                    color: #A3BE8C; /* 路径使用绿色，更醒目 */
+                }
+    
+                /* ---- 下拉选择框 ---- */
+                QComboBox {
+                    background-color: #434C5E;
+                    border: 1px solid #4C566A;
+                    border-radius: 4px;
+                    padding: 5px 10px;
+                }
+                QComboBox:hover {
+                    border: 1px solid #88C0D0; /* 悬停时边框高亮 - 浅蓝 */
+                }
+                QComboBox::drop-down {
+                    border: none;
+                }
+                QComboBox::down-arrow {
+                    image: url(down_arrow.png); /* 您需要一个下拉箭头图标 */
+                }
+    
+                /* ---- 按钮 ---- */
+                QPushButton {
+                    min-height: 32px;
+                    min-width: 80px;
+                    padding: 5px 15px;
+                    border: none;
+                    border-radius: 4px;
+                    color: #ECEFF4;
+                }
+                QPushButton:hover {
+                    background-color: #4C566A;
+                }
+                QPushButton:pressed {
+                    background-color: #2E3440;
+                }
+    
+                /* 开始按钮的特定样式 */
+                QPushButton#startButton {
+                    background-color: #5E81AC; /* 蓝色 */
+                }
+                QPushButton#startButton:hover {
+                    background-color: #81A1C1;
+                }
+    
+                /* 取消按钮的特定样式 */
+                QPushButton#cancelButton {
+                    background-color: #BF616A; /* 红色 */
+                }
+                QPushButton#cancelButton:hover {
+                    background-color: #D08770; /* 悬停时变为橙色 */
+                }
+                
+                QPushButton:disabled {
+                    background-color: #4C566A;
+                    color: #6c7583;
+                }
+    
+                /* ---- 进度条 ---- */
+                QProgressBar {
+                    border: 1px solid #4C566A;
+                    border-radius: 4px;
+                    text-align: center;
+                    color: #ECEFF4;
+                    background-color: #3B4252;
+                }
+                QProgressBar::chunk {
+                    background-color: #A3BE8C; /* 进度条填充色 - 绿色 */
+                    border-radius: 3px;
+                }
+                
+                /* ---- 日志文本框 ---- */
+                QPlainTextEdit {
+                    background-color: #272B35; /* 稍亮的黑色 */
+                    color: #D8DEE9;
+                    border: 1px solid #4C566A;
+                    border-radius: 4px;
+                    font-family: 'Consolas', 'Courier New', 'monospace';
+                    font-size: 10pt;
+                }
+    
+                /* ---- 滚动条 ---- */
+                QScrollBar:vertical {
+                    border: none;
+                    background: #3B4252;
+                    width: 10px;
+                    margin: 0px 0px 0px 0px;
+                }
+                QScrollBar::handle:vertical {
+                    background: #5E81AC;
+                    min-height: 20px;
+                    border-radius: 5px;
+                }
+                QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
+                    border: none;
+                    background: none;
+                }
+            """)
+
+    # 可在任意线程调用，实际显示由 flush_log 定时批量完成
+    def log_message(self, msg):
+        self.log_sink.append(msg)
+
+    def flush_log(self):
+        lines = self.log_sink.drain()
+        if not lines:
+            return
+        self.log.appendPlainText("\n".join(lines))
+        self.log.verticalScrollBar().setValue(self.log.verticalScrollBar().maximum())
+
+    def select_video_file(self):
+        file, _ = QFileDialog.getOpenFileName(
+            self, "选择视频", self.last_dir or "", "视频文件 (*.mp4 *.mkv *.avi *.mov)"
+        )
+        if file:
+            self.video_path_label.setText(file)
+            self.last_dir = os.path.dirname(file)
+
+    def add_queue_videos(self):
+        files, _ = QFileDialog.getOpenFileNames(
+            self, "添加到队列", self.last_dir or "", "视频文件 (*.mp4 *.mkv *.avi *.mov)"
+        )
+        if not files:
+            return
+        try:
+            target_langs = parse_target_languages(self.target_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "提示", str(e))
+            return
+        self.last_dir = os.path.dirname(files[0])
+        for file in files:
+            self.queue.add(file, self.lang_combo.currentText(), self.model_combo.currentText(),
+                           self.mode_combo.currentData(), target_langs)
+
+    def start_queue(self):
+        self.queue.retry_failed()
+        self.queue.start()
+        self.btn_queue_start.setEnabled(False)
+        self.btn_queue_stop.setEnabled(True)
+
+    def stop_queue(self):
+        self.queue.stop()
+        self.btn_queue_start.setEnabled(True)
+        self.btn_queue_stop.setEnabled(False)
+
+    def clear_queue(self):
+        self.queue.clear_finished()
+        known = {record["id"] for record in self.queue.records}
+        for job_id in [job_id for job_id in self.queue_items if job_id not in known]:
+            self.queue_list.takeItem(self.queue_list.row(self.queue_items.pop(job_id)))
+
+    # 在队列列表中显示任务当前所在阶段、状态和进度
+    def update_queue_item(self, record):
+        item = self.queue_items.get(record["id"])
+        if item is None:
+            item = QListWidgetItem()
+            self.queue_list.addItem(item)
+            self.queue_items[record["id"]] = item
+        status = {"pending": "排队中", "running": "进行中", "done": "已完成", "failed": "失败"}[record["status"]]
+        text = f"{os.path.basename(record['video_path'])}  [{status}]"
+        if record["status"] in ("pending", "running"):
+            text += f"  {QUEUE_STAGE_TITLES[record['stage']]}"
+        if record["status"] == "running" and record["progress"]:
+            text += f" {record['progress']}%  剩余 {format_eta(record.get('eta'))}"
+        if record["status"] == "failed":
+            text += f"  {record['error']}"
+        item.setText(text)
+
+    def start_preview(self):
+        self.start_process(preview_window=(self.preview_start.value(), self.preview_duration.value()))
+
+    def start_process(self, preview_window=None):
+        path = self.video_path_label.text()
+        if not path or path == "未选择视频文件":
+            QMessageBox.warning(self, "提示", "请先选择视频文件")
+            return
+
+        language = self.lang_combo.currentText()
+        model = self.model_combo.currentText()
+        subtitle_mode = self.mode_combo.currentData()
+        try:
+            target_langs = parse_target_languages(self.target_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "提示", str(e))
+            return
+        self.update_progress(0)
+
+        self.process_thread = ProcessThread(path, language, model, self.api_key, subtitle_mode, target_langs,
+                                            preview_window=preview_window or None, log_callback=self.log_message)
+        self.process_thread.progress_signal.connect(self.update_progress)
+        self.process_thread.error_signal.connect(self.show_error)
+        self.process_thread.finished_signal.connect(self.process_finished)
+        self.process_thread.start()
+
+        self.btn_start.setEnabled(False)
+        self.btn_preview.setEnabled(False)
+        self.btn_cancel.setEnabled(True)
+
+    # 进度条同时显示剩余时间（有估算时）
+    def update_progress(self, value, eta=None):
+        self.progress.setValue(value)
+        self.progress.setFormat("%p%" if eta is None or value >= 100 else f"%p%  剩余 {format_eta(eta)}")
+
+    def cancel_process(self):
+        if self.process_thread and self.process_thread.isRunning():
+            self.process_thread.stop()
+            self.process_thread.wait()
+            self.update_progress(0)
+            self.log_message("[INFO] 已取消")
+
+        self.btn_start.setEnabled(True)
+        self.btn_preview.setEnabled(True)
+        self.btn_cancel.setEnabled(False)
+
+    def process_finished(self, output):
+        self.update_progress(100)
+        self.btn_start.setEnabled(True)
+        self.btn_preview.setEnabled(True)
+        self.btn_cancel.setEnabled(False)
+        QMessageBox.information(self, "完成", f"处理完成：\n{output}")
+        open_folder(output.split("\n")[0])
+
+    def show_error(self, msg):
+        self.log_message("[ERROR] " + msg)
+        QMessageBox.critical(self, "错误", msg)
+        self.btn_start.setEnabled(True)
+        self.btn_preview.setEnabled(True)
+        self.btn_cancel.setEnabled(False)
+
+    def closeEvent(self, e):
+        if self.process_thread and self.process_thread.isRunning():
+            self.process_thread.stop()
+            self.process_thread.wait()
+        self.queue.stop()
+        shutdown_whisper_worker()
+        self.log_timer.stop()
+        self.flush_log()
+        self.log_sink.close()
+        e.accept()
+
+def main():
+    app = QApplication(sys.argv)
+    window = VideoSubtitleApp()
+    window.show()
+    return app.exec_()